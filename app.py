@@ -1,513 +1,550 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import datetime
 import pytz
 
+from stocks.aggregate import aggregate_exposure, to_reference_strikes
+from stocks.charts import (price_series, price_figure, strike_bar_figure, max_pain_figure, exposure_figure,
+                           strike_totals_figure, history_figure, surface_figure, scenario_figure,
+                           STRIKE_METRICS)
+from stocks.key_levels import combined_gamma_profile, zero_crossing
+from stocks.metrics import metrics
+from stocks.pipeline import (iter_tickers, load_ticker, load_ticker_exposure, exposure_history, NoDataError,
+                             MAX_WORKERS)
+from stocks.market_data import prefetch_history
+from stocks.poller import poller, PolledTicker
+from stocks.scenarios import scenario_grid
+from stocks.scheduler import fetch_priority, RateLimitError, INTERACTIVE
+
 # Set page layout
 st.set_page_config(layout="wide")
 
-# Predefined tickers
-predefined_tickers = ['SPX', 'SPY', 'NDX', 'QQQ', 'RUT', 'IWM', 
-                     'AAPL', 'AMD', 'AMZN', 'MSFT', 'META', 'TSLA', 'GOOG', 'NVDA']
+# Stage timings of this run, profiled when requested from the debug panel
+profile_run = st.session_state.pop('profile_next_run', False)
+page_run = metrics.begin_run('page', profile=profile_run)
+try:
+    # cProfile only sees the script thread, so a profiled run fetches tickers serially
+    max_workers = 1 if profile_run else MAX_WORKERS
+
+    # Predefined tickers
+    predefined_tickers = ['SPX', 'SPY', 'NDX', 'QQQ', 'RUT', 'IWM', 
+                         'AAPL', 'AMD', 'AMZN', 'MSFT', 'META', 'TSLA', 'GOOG', 'NVDA']
 
-# Create tabs for different views
-tab1, tab2 = st.tabs(["Single Ticker Analysis", "Aggregated Exposure View"])
+    # Price chart timeframes
+    timeframes = ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y']
 
-# ==============================================
-# TAB 1: Single Ticker Analysis
-# ==============================================
-with tab1:
-    # Sidebar navigation
-    with st.sidebar:
-        st.header("Ticker Selection")
-        selected_tickers = []
+
+    def ticker_job(ticker):
+        """Fetch arguments for one ticker panel, taken from its widget state.
         
-        # Predefined tickers checkboxes
-        st.subheader("Predefined Tickers")
-        cols = st.columns(2)
-        for i, ticker in enumerate(predefined_tickers):
-            with cols[i % 2]:
-                if st.checkbox(ticker, key=f"pre_{ticker}"):
-                    selected_tickers.append(ticker)
+        Data is read through the process-wide poller shared with other sessions.
+        """
+        return dict(ticker_factory=PolledTicker,
+                    expiration=st.session_state.get(f"exp_{ticker}"),
+                    period=st.session_state.get(f"timeframe_{ticker}", '1mo'),
+                    all_expirations=(st.session_state.get(f"term_{ticker}", False)
+                                     or st.session_state.get(f"surface_{ticker}", False)))
+
+
+    def show_chart(fig, ticker=None):
+        """Draw a Plotly figure, timing its serialization as the 'plot' stage."""
+        with metrics.stage('plot', ticker):
+            st.plotly_chart(fig, use_container_width=True)
+
+
+    def ticker_scenarios(data, days):
+        """Scenario grid of a panel's chain, reused while the chain and `days` are unchanged."""
+        key = f"scenarios_{data.ticker}"
+        cached = st.session_state.get(key)
+        if cached is not None and cached[0] is data.chain and cached[1] == days:
+            return cached[2]
+        with metrics.stage('scenarios', data.ticker):
+            scenarios = scenario_grid(data.chain, data.current_price, days=days)
+        st.session_state[key] = (data.chain, days, scenarios)
+        return scenarios
+
+
+    def render_debug(run):
+        """Debug panel: stage timings and counters of `run`, recent runs and p50/p95 latencies."""
+        st.caption(f"Page run: {run.seconds:.2f}s")
+        stages = pd.DataFrame(run.stages, columns=['stage', 'ticker', 'seconds']).fillna({'ticker': '-'})
+        if not stages.empty:
+            st.dataframe(stages.pivot_table(index='stage', columns='ticker', values='seconds',
+                                            aggfunc='sum', fill_value=0.0).round(3))
+        st.json(dict(run.counters))
+        st.caption(f"Shared poller: {len(poller)} subscriptions for {', '.join(poller.tickers()) or 'no tickers'}, "
+                   f"{poller.refreshes} background refreshes, {poller.errors} errors")
+        
+        # Recent runs, including fragment reruns since the last page run
+        recent = pd.DataFrame([dict(name=r.name, seconds=round(r.seconds, 3), **r.counters)
+                               for r in list(metrics.runs)[-20:]])
+        st.dataframe(recent.iloc[::-1].fillna(0), hide_index=True)
+        st.dataframe(pd.DataFrame(metrics.percentiles()).T.round(3))
         
-        # Custom ticker input
-        st.subheader("Custom Ticker")
-        custom_ticker = st.text_input("Enter any ticker symbol:")
-        if custom_ticker:
-            selected_tickers.append(custom_ticker.upper())
+        if run.profile:
+            st.code(run.profile)
+            st.download_button("Download profile", run.profile, file_name="profile.txt")
 
-    # Main content
-    if not selected_tickers:
-        st.warning("Please select at least one ticker from the sidebar")
-    else:
-        for ticker in selected_tickers:
+
+    @metrics.in_run('panel')
+    def render_ticker(ticker):
+        """Render one ticker panel.
+        
+        Runs as a fragment: on a full page run it uses the data prefetched for
+        every ticker concurrently; when it reruns on its own (live refresh or one
+        of its widgets changing) it refreshes only this ticker, recomputing just
+        the strikes whose quotes changed.
+        """
+        job = ticker_job(ticker)
+        period = job['period']
+        result = st.session_state.setdefault('prefetched', {}).pop(ticker, None)
+        if result is None:
             try:
-                # Get stock data
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1d")
-                
-                if hist.empty:
-                    st.error(f"No data available for {ticker}")
-                    continue
-                    
-                current_price = hist['Close'].iloc[-1]
-                current_time = datetime.now(pytz.timezone('US/Eastern')).strftime('%H:%M:%S')
-                current_date = datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d')
-                
-                # Header section
-                st.markdown(f"**{ticker} - ${current_price:.2f} as of {current_time} {current_date}**")
-                
-                # Expiration date selection
-                exp_dates = stock.options
-                selected_exp = st.selectbox(f"Select expiration date for {ticker}", exp_dates)
+                # The user is looking at this panel: its requests go ahead of background refreshes
+                with fetch_priority(INTERACTIVE):
+                    result = load_ticker(ticker, previous=st.session_state.get(f"data_{ticker}"), **job), None
+            except Exception as e:
+                result = None, e
+        data, error = result
+        
+        try:
+            if error is not None:
+                raise error
+            st.session_state[f"data_{ticker}"] = data
+            
+            current_price = data.current_price
+            current_time = datetime.now(pytz.timezone('US/Eastern')).strftime('%H:%M:%S')
+            current_date = datetime.now(pytz.timezone('US/Eastern')).strftime('%Y-%m-%d')
+            
+            # Header section
+            st.markdown(f"**{ticker} - ${current_price:.2f} as of {current_time} {current_date}**")
+            
+            # Expiration date selection
+            exp_dates = data.expirations
+            selected_exp = st.selectbox(f"Select expiration date for {ticker}", exp_dates,
+                                        index=exp_dates.index(data.expiration), key=f"exp_{ticker}")
+            
+            # Timeframe selection for price chart
+            selected_timeframe = st.selectbox("Select timeframe for price chart", timeframes,
+                                              index=timeframes.index(period), key=f"timeframe_{ticker}")
+            
+            # Historical data for selected timeframe
+            price_data = data.price_data
+            
+            # Create three columns for charts
+            col1, col2, col3 = st.columns([2, 1, 1])
+            
+            with col1:
+                # Price chart, downsampled to the chart width (WebGL for large series)
+                price_x, price_y = price_series(ticker, period, price_data)
+                show_chart(price_figure(ticker, price_x, price_y, points=len(price_data)), ticker)
+            
+            with col2:
+                # Metric selection for horizontal bar chart
+                selected_metric = st.selectbox("Select metric to display", list(STRIKE_METRICS), key=f"metric_{ticker}")
                 
-                # Timeframe selection for price chart
-                timeframes = ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y']
-                selected_timeframe = st.selectbox("Select timeframe for price chart", timeframes, index=2)
+                # Real options chain with dealer greeks exposure per strike
+                by_strike = data.by_strike
+                delta = by_strike['delta_exposure'].to_numpy()
+                gamma = by_strike['gamma_exposure'].to_numpy()
+                show_chart(strike_bar_figure(by_strike, selected_metric, ticker, current_price), ticker)
+            
+            with col3:
+                # Dealer exposure repriced over spot x IV shocks, optionally some days forward
+                # Only whole days before the last expiration, so some contracts are left to reprice
+                max_days = min(30, int(data.chain['t'].max() * 365))
+                if max_days > 0:
+                    days_forward = st.slider("Days forward", 0, max_days, 0, key=f"days_{ticker}")
+                else:
+                    days_forward = 0
+                scenarios = ticker_scenarios(data, days_forward)
+                scenario_metric = selected_metric if isinstance(STRIKE_METRICS[selected_metric], str) else 'Gamma'
+                show_chart(scenario_figure(scenarios, scenario_metric, ticker, current_price), ticker)
+            
+            # Recommendation section
+            st.subheader("Market Maker Positioning Analysis")
+            
+            # Calculate days to expiration
+            exp_date = datetime.strptime(selected_exp, "%Y-%m-%d")
+            days_to_exp = (exp_date - datetime.now()).days
+            
+            # Key levels from the spot sweep
+            levels = data.levels
+            gamma_flip = f"${levels.zero_gamma:.2f}" if levels.zero_gamma is not None else "none within ±15%"
+            call_wall = f"${levels.call_wall:.2f}" if levels.call_wall is not None else "none (no call open interest)"
+            put_wall = f"${levels.put_wall:.2f}" if levels.put_wall is not None else "none (no put open interest)"
+            pain = data.max_pain.set_index('expiration')['max_pain']
+            max_pain_strike = pain[selected_exp]
+            
+            # Generate recommendation based on expiration type
+            with st.container():
+                st.markdown(f"""
+                **{ticker} Options Analysis for {selected_exp} ({days_to_exp} days to expiry)**
                 
-                # Get historical data for selected timeframe
-                price_data = stock.history(period=selected_timeframe)
+                ### Market Maker Positioning:
+                - **Current Spot Price:** ${current_price:.2f}
+                - **Gamma Exposure:** {'Positive' if np.sum(gamma) > 0 else 'Negative'} (${abs(np.sum(gamma)):,.0f} per 1% move)
+                - **Delta Exposure:** {'Long' if np.sum(delta) > 0 else 'Short'} (${abs(np.sum(delta)):,.0f} notional)
+                - **Key Strike Levels:** 
+                    - Gamma Flip: {gamma_flip}
+                    - Call Wall: {call_wall}
+                    - Put Wall: {put_wall}
+                    - Max Pain: ${max_pain_strike:.2f}
                 
-                # Create two columns for charts
-                col1, col2 = st.columns([2, 1])
+                ### Expected Moves by Expiry Type:
+                """)
                 
-                with col1:
-                    # Price chart
-                    fig_price = go.Figure()
-                    fig_price.add_trace(go.Scatter(
-                        x=price_data.index, 
-                        y=price_data['Close'],
-                        line=dict(color='royalblue', width=2),
-                        name='Price'
+                # 0DTE Analysis
+                if days_to_exp == 0:
+                    st.markdown("""
+                    **0DTE Positioning:**
+                    - Market makers will aggressively hedge gamma exposure
+                    - Expect pinning behavior near high open interest strikes
+                    - Potential for sharp moves if price breaks through gamma walls
+                    - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
+                    """.format(
+                        current_price * 0.99,
+                        current_price * 1.01
                     ))
-                    fig_price.update_layout(
-                        title=f"{ticker} Price Chart",
-                        xaxis_title="Date",
-                        yaxis_title="Price",
-                        hovermode="x unified"
-                    )
-                    st.plotly_chart(fig_price, use_container_width=True)
                 
-                with col2:
-                    # Metric selection for horizontal bar chart
-                    metrics = ['Open Interest', 'Traded Volume', 'Delta', 'Gamma', 'Vanna', 'Charm']
-                    selected_metric = st.selectbox("Select metric to display", metrics)
-                    
-                    # Generate mock options data (replace with real options chain)
-                    strikes = np.linspace(current_price * 0.7, current_price * 1.3, 20)
-                    calls = np.random.randint(100, 1000, size=20)
-                    puts = np.random.randint(100, 1000, size=20)
-                    
-                    # Calculate mock greeks (replace with real calculations)
-                    delta = np.linspace(-1, 1, 20)
-                    gamma = np.random.normal(0, 0.2, 20)
-                    vanna = np.random.normal(0, 0.1, 20)
-                    charm = np.random.normal(0, 0.05, 20)
-                    
-                    # Create horizontal bar chart based on selected metric
-                    fig_bar = go.Figure()
-                    
-                    if selected_metric == 'Open Interest':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=calls,
-                            name='Calls',
-                            orientation='h',
-                            marker_color='rgba(55, 128, 191, 0.7)'
-                        ))
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=-puts,
-                            name='Puts',
-                            orientation='h',
-                            marker_color='rgba(255, 128, 191, 0.7)'
-                        ))
-                        fig_bar.update_layout(barmode='relative')
-                        
-                    elif selected_metric == 'Traded Volume':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=calls*0.3,
-                            name='Calls Volume',
-                            orientation='h',
-                            marker_color='rgba(55, 128, 191, 0.7)'
-                        ))
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=-puts*0.3,
-                            name='Puts Volume',
-                            orientation='h',
-                            marker_color='rgba(255, 128, 191, 0.7)'
-                        ))
-                        fig_bar.update_layout(barmode='relative')
-                        
-                    elif selected_metric == 'Delta':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=delta,
-                            orientation='h',
-                            marker_color=np.where(delta > 0, 'rgba(55, 128, 191, 0.7)', 'rgba(255, 128, 191, 0.7)')
-                        ))
-                        
-                    elif selected_metric == 'Gamma':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=gamma,
-                            orientation='h',
-                            marker_color=np.where(gamma > 0, 'rgba(55, 128, 191, 0.7)', 'rgba(255, 128, 191, 0.7)')
-                        ))
-                        
-                    elif selected_metric == 'Vanna':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=vanna,
-                            orientation='h',
-                            marker_color=np.where(vanna > 0, 'rgba(55, 128, 191, 0.7)', 'rgba(255, 128, 191, 0.7)')
-                        ))
-                        
-                    elif selected_metric == 'Charm':
-                        fig_bar.add_trace(go.Bar(
-                            y=strikes,
-                            x=charm,
-                            orientation='h',
-                            marker_color=np.where(charm > 0, 'rgba(55, 128, 191, 0.7)', 'rgba(255, 128, 191, 0.7)')
-                        ))
-                    
-                    # Add current price line
-                    fig_bar.add_vline(x=0, line_width=0.5, line_color="gray")
-                    fig_bar.add_hline(y=current_price, line_dash="dot", line_color="black", line_width=2)
-                    
-                    fig_bar.update_layout(
-                        title=f"{selected_metric} Exposure for {ticker}",
-                        yaxis_title="Strike Price",
-                        xaxis_title=selected_metric,
-                        showlegend=selected_metric in ['Open Interest', 'Traded Volume'],
-                        height=600
-                    )
-                    st.plotly_chart(fig_bar, use_container_width=True)
+                # Weekly Analysis
+                elif days_to_exp <= 7:
+                    st.markdown("""
+                    **Weekly Positioning:**
+                    - Gamma exposure will dominate price action
+                    - Market makers will adjust delta hedges more frequently
+                    - Expect mean-reversion toward high open interest strikes
+                    - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
+                    """.format(
+                        current_price * 0.97,
+                        current_price * 1.03
+                    ))
                 
-                # Recommendation section
-                st.subheader("Market Maker Positioning Analysis")
+                # Monthly Analysis
+                elif days_to_exp <= 30:
+                    st.markdown("""
+                    **Monthly Positioning:**
+                    - Vanna and Charm effects become more significant
+                    - Market makers will adjust for volatility changes
+                    - Expect gradual moves toward max pain
+                    - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
+                    """.format(
+                        current_price * 0.95,
+                        current_price * 1.05
+                    ))
                 
-                # Calculate days to expiration
-                exp_date = datetime.strptime(selected_exp, "%Y-%m-%d")
-                days_to_exp = (exp_date - datetime.now()).days
+                # LEAPS Analysis
+                else:
+                    st.markdown("""
+                    **LEAPS Positioning:**
+                    - Delta hedging is primary concern for market makers
+                    - Expect more gradual adjustments to positions
+                    - Volatility surface changes will impact pricing
+                    - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
+                    """.format(
+                        current_price * 0.90,
+                        current_price * 1.10
+                    ))
                 
-                # Generate recommendation based on expiration type
-                with st.container():
-                    st.markdown(f"""
-                    **{ticker} Options Analysis for {selected_exp} ({days_to_exp} days to expiry)**
-                    
-                    ### Market Maker Positioning:
-                    - **Current Spot Price:** ${current_price:.2f}
-                    - **Gamma Exposure:** {'Positive' if np.sum(gamma) > 0 else 'Negative'} (${abs(np.sum(gamma)):.2f} per 1% move)
-                    - **Delta Exposure:** {'Long' if np.sum(delta) > 0 else 'Short'} ({abs(np.sum(delta)):.2f} contracts)
-                    - **Key Strike Levels:** 
-                        - Gamma Flip: ${current_price * (1 + np.mean(gamma)):.2f}
-                        - Max Pain: ${strikes[np.argmin(np.abs(delta))]:.2f}
-                    
-                    ### Expected Moves by Expiry Type:
-                    """)
-                    
-                    # 0DTE Analysis
-                    if days_to_exp == 0:
-                        st.markdown("""
-                        **0DTE Positioning:**
-                        - Market makers will aggressively hedge gamma exposure
-                        - Expect pinning behavior near high open interest strikes
-                        - Potential for sharp moves if price breaks through gamma walls
-                        - Key levels: ${0:.2f} (support), ${0:.2f} (resistance)
-                        """.format(
-                            current_price * 0.99,
-                            current_price * 1.01
-                        ))
-                    
-                    # Weekly Analysis
-                    elif days_to_exp <= 7:
-                        st.markdown("""
-                        **Weekly Positioning:**
-                        - Gamma exposure will dominate price action
-                        - Market makers will adjust delta hedges more frequently
-                        - Expect mean-reversion toward high open interest strikes
-                        - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
-                        """.format(
-                            current_price * 0.97,
-                            current_price * 1.03
-                        ))
-                    
-                    # Monthly Analysis
-                    elif days_to_exp <= 30:
-                        st.markdown("""
-                        **Monthly Positioning:**
-                        - Vanna and Charm effects become more significant
-                        - Market makers will adjust for volatility changes
-                        - Expect gradual moves toward max pain
-                        - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
-                        """.format(
-                            current_price * 0.95,
-                            current_price * 1.05
-                        ))
-                    
-                    # LEAPS Analysis
-                    else:
-                        st.markdown("""
-                        **LEAPS Positioning:**
-                        - Delta hedging is primary concern for market makers
-                        - Expect more gradual adjustments to positions
-                        - Volatility surface changes will impact pricing
-                        - Key levels: ${0:.2f} (support), ${1:.2f} (resistance)
-                        """.format(
-                            current_price * 0.90,
-                            current_price * 1.10
-                        ))
-                    
+                # Where the gamma flip moves if IV is repriced, from the scenario grid
+                flat_iv = np.abs(scenarios.vol_shocks).argmin()
+                flips = [(shock, zero_crossing(scenarios.spots, scenarios.gamma_exposure[:, i], current_price))
+                         for shock, i in [(0.0, flat_iv), (scenarios.vol_shocks[-1], -1), (scenarios.vol_shocks[0], 0)]]
+                hedge = np.interp([current_price * 0.95, current_price * 1.05], scenarios.spots,
+                                  scenarios.delta_exposure[:, flat_iv])
+                if np.isnan(hedge).all():
                     st.markdown("""
-                    **Trading Recommendation:**
-                    - Monitor gamma exposure changes near key levels
-                    - Watch for delta hedging flows at ${0:.2f} and ${1:.2f}
-                    - Consider {'call skew' if np.mean(delta) > 0 else 'put skew'} strategies
+                    **Scenario Grid ({0} days forward):**
+                    - No open contracts left to reprice
+                    """.format(days_forward))
+                else:
+                    st.markdown("""
+                    **Scenario Grid ({0} days forward):**
+                    - Gamma flip {1}
+                    - Dealer delta changes by ${2:,.0f} from a 5% drop to a 5% rally at current IV
                     """.format(
-                        current_price * 0.98,
-                        current_price * 1.02
+                        days_forward,
+                        ", ".join(f"{shock * 100:+.0f} vol: " + (f"${flip:.2f}" if flip is not None else "none")
+                                  for shock, flip in flips),
+                        hedge[1] - hedge[0]
                     ))
-                    
-            except Exception as e:
-                st.error(f"Error processing {ticker}: {str(e)}")
+                
+                st.markdown("""
+                **Trading Recommendation:**
+                - Monitor gamma exposure changes near key levels
+                - Watch for delta hedging flows at ${0:.2f} and ${1:.2f}
+                - Consider {2} strategies
+                """.format(
+                    current_price * 0.98,
+                    current_price * 1.02,
+                    'call skew' if np.mean(delta) > 0 else 'put skew'
+                ))
+            
+            # Max pain across every listed expiration (loads all chains for this ticker)
+            if st.checkbox("Show max pain term structure", key=f"term_{ticker}"):
+                show_chart(max_pain_figure(ticker, data.max_pain, current_price), ticker)
+            
+            # Smoothed IV across every strike and expiration (also loads all chains)
+            if st.checkbox("Show IV surface", key=f"surface_{ticker}") and data.surface is not None:
+                if len(data.surface):
+                    show_chart(surface_figure(data.surface, ticker), ticker)
+                    if data.surface.butterfly:
+                        st.caption(f"Flattened for butterfly arbitrage: {', '.join(data.surface.butterfly)}")
+                else:
+                    st.info(f"No usable option quotes to fit an IV surface for {ticker}")
+            
+        except NoDataError as e:
+            st.error(str(e))
+        except RateLimitError as e:
+            st.warning(f"{ticker}: {str(e)}")
+        except Exception as e:
+            st.error(f"Error processing {ticker}: {str(e)}")
 
-# ==============================================
-# TAB 2: Aggregated Exposure View
-# ==============================================
-with tab2:
-    st.header("Aggregated Options Exposure Analysis")
-    
-    # Ticker selection for this view
-    selected_tickers_agg = st.multiselect(
-        "Select tickers for aggregated view",
-        predefined_tickers,
-        default=['SPY', 'QQQ', 'IWM']
-    )
-    
-    if not selected_tickers_agg:
-        st.warning("Please select at least one ticker")
-    else:
-        # Time selection
-        time_range = st.selectbox(
-            "Time range",
-            ["1d", "5d", "1mo", "3mo", "6mo"],
-            index=2
-        )
-        
-        # Generate mock aggregated data (replace with real data)
-        strikes = np.linspace(0.8, 1.2, 41) * 4000  # SPX-like strikes
-        gamma = np.random.normal(0, 1, len(strikes)).cumsum()
-        delta = np.random.normal(0, 2, len(strikes)).cumsum()
-        vanna = np.random.normal(0, 0.5, len(strikes)).cumsum()
-        charm = np.random.normal(0, 0.2, len(strikes)).cumsum()
-        
-        # Create the main exposure chart
-        fig_exposure = go.Figure()
-        
-        # Add traces for each metric
-        fig_exposure.add_trace(go.Scatter(
-            x=strikes,
-            y=gamma,
-            name="Gamma Exposure",
-            line=dict(color='#1f77b4', width=2),
-            yaxis="y1"
-        ))
-        
-        fig_exposure.add_trace(go.Scatter(
-            x=strikes,
-            y=delta,
-            name="Delta Exposure",
-            line=dict(color='#ff7f0e', width=2),
-            yaxis="y2"
-        ))
-        
-        fig_exposure.add_trace(go.Scatter(
-            x=strikes,
-            y=vanna,
-            name="Vanna Exposure",
-            line=dict(color='#2ca02c', width=2),
-            yaxis="y3"
-        ))
-        
-        fig_exposure.add_trace(go.Scatter(
-            x=strikes,
-            y=charm,
-            name="Charm Exposure",
-            line=dict(color='#d62728', width=2),
-            yaxis="y4"
-        ))
-        
-        # Add current price line (mock)
-        current_price = 4000
-        fig_exposure.add_vline(
-            x=current_price,
-            line=dict(color="black", width=2, dash="dot"),
-            annotation_text="Current Price",
-            annotation_position="top right"
-        )
+    # Create tabs for different views
+    tab1, tab2 = st.tabs(["Single Ticker Analysis", "Aggregated Exposure View"])
+
+    # ==============================================
+    # TAB 1: Single Ticker Analysis
+    # ==============================================
+    with tab1:
+        # Sidebar navigation
+        with st.sidebar:
+            st.header("Ticker Selection")
+            selected_tickers = []
+            
+            # Predefined tickers checkboxes
+            st.subheader("Predefined Tickers")
+            cols = st.columns(2)
+            for i, ticker in enumerate(predefined_tickers):
+                with cols[i % 2]:
+                    if st.checkbox(ticker, key=f"pre_{ticker}"):
+                        selected_tickers.append(ticker)
+            
+            # Custom ticker input
+            st.subheader("Custom Ticker")
+            custom_ticker = st.text_input("Enter any ticker symbol:")
+            if custom_ticker:
+                selected_tickers.append(custom_ticker.upper())
+            
+            # Live refresh of each panel and the aggregated view
+            st.subheader("Live Mode")
+            live_mode = st.checkbox("Auto-refresh", key="live_mode")
+            refresh_seconds = st.slider("Refresh interval (seconds)", 5, 60, 5, disabled=not live_mode)
+            refresh_every = refresh_seconds if live_mode else None
+            if live_mode:
+                st.caption("Greeks depend on spot: while the underlying trades, every contract is recomputed "
+                           "on each refresh. Only requoted strikes are recomputed while spot is unchanged.")
+            
+            # Per-stage timings, cache and network counters, optional profile
+            st.subheader("Debug")
+            show_debug = st.checkbox("Show timings", key="debug_metrics")
+            if show_debug and st.button("Profile next run"):
+                st.session_state['profile_next_run'] = True
+                st.rerun()
+            debug_panel = st.container()
+
+        # Main content
+        if not selected_tickers:
+            st.warning("Please select at least one ticker from the sidebar")
+        else:
+            # Drop duplicates (a custom ticker may repeat a checkbox) keeping sidebar order
+            selected_tickers = list(dict.fromkeys(selected_tickers))
+            
+            # Each panel is a fragment; in live mode it also reruns on its own timer
+            ticker_panel = st.fragment(render_ticker, run_every=refresh_every)
+            
+            # Placeholders keep panels in sidebar order while they fill in as data arrives
+            panels = {ticker: st.container() for ticker in selected_tickers}
+            jobs = [(ticker, dict(ticker_job(ticker), previous=st.session_state.get(f"data_{ticker}")))
+                    for ticker in selected_tickers]
+            
+            # One bulk request for every panel's quote and price history instead of one per ticker
+            try:
+                prefetch_history(selected_tickers, '1d')
+                periods = {}
+                for ticker, job in jobs:
+                    periods.setdefault(job['period'], []).append(ticker)
+                for period, tickers in periods.items():
+                    prefetch_history(tickers, period)
+            except Exception:
+                # Each ticker retries on its own below and reports its own error
+                pass
+            
+            # Fetch and compute every ticker concurrently, render each one when ready
+            prefetched = st.session_state['prefetched'] = {}
+            for ticker, data, error in iter_tickers(jobs, max_workers=max_workers):
+                prefetched[ticker] = data, error
+                with panels[ticker]:
+                    ticker_panel(ticker)
+
+    # ==============================================
+    # TAB 2: Aggregated Exposure View
+    # ==============================================
+    @metrics.in_run('aggregated')
+    def render_aggregated():
+        """Aggregated exposure view; a fragment so it refreshes on its own in live mode."""
+        st.header("Aggregated Options Exposure Analysis")
         
-        # Update layout for multi-axis
-        fig_exposure.update_layout(
-            title="Aggregated Options Exposure Across Strikes",
-            xaxis_title="Strike Price",
-            yaxis=dict(
-                title="Gamma Exposure",
-                titlefont=dict(color="#1f77b4"),
-                tickfont=dict(color="#1f77b4"),
-                side="left",
-                position=0.05
-            ),
-            yaxis2=dict(
-                title="Delta Exposure",
-                titlefont=dict(color="#ff7f0e"),
-                tickfont=dict(color="#ff7f0e"),
-                overlaying="y",
-                side="right"
-            ),
-            yaxis3=dict(
-                title="Vanna Exposure",
-                titlefont=dict(color="#2ca02c"),
-                tickfont=dict(color="#2ca02c"),
-                overlaying="y",
-                side="right",
-                position=0.85
-            ),
-            yaxis4=dict(
-                title="Charm Exposure",
-                titlefont=dict(color="#d62728"),
-                tickfont=dict(color="#d62728"),
-                overlaying="y",
-                side="right",
-                position=0.95
-            ),
-            hovermode="x unified",
-            height=600,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
+        # Ticker selection for this view
+        selected_tickers_agg = st.multiselect(
+            "Select tickers for aggregated view",
+            predefined_tickers,
+            default=['SPY', 'QQQ', 'IWM']
         )
         
-        st.plotly_chart(fig_exposure, use_container_width=True)
-        
-        # Create OI/Volume charts in columns
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Open Interest chart
-            oi_calls = np.random.randint(0, 1000, len(strikes))
-            oi_puts = np.random.randint(0, 1000, len(strikes))
-            
-            fig_oi = go.Figure()
-            fig_oi.add_trace(go.Bar(
-                x=strikes,
-                y=oi_calls,
-                name="Calls OI",
-                marker_color='#1f77b4'
-            ))
-            fig_oi.add_trace(go.Bar(
-                x=strikes,
-                y=-oi_puts,
-                name="Puts OI",
-                marker_color='#d62728'
-            ))
-            fig_oi.add_vline(
-                x=current_price,
-                line=dict(color="black", width=2, dash="dot")
-            )
-            fig_oi.update_layout(
-                title="Open Interest by Strike",
-                barmode="relative",
-                height=400,
-                yaxis_title="Contracts",
-                hovermode="x unified"
-            )
-            st.plotly_chart(fig_oi, use_container_width=True)
-        
-        with col2:
-            # Volume chart
-            vol_calls = (oi_calls * np.random.uniform(0.1, 0.3, len(strikes))).astype(int)
-            vol_puts = (oi_puts * np.random.uniform(0.1, 0.3, len(strikes))).astype(int)
-            
-            fig_vol = go.Figure()
-            fig_vol.add_trace(go.Bar(
-                x=strikes,
-                y=vol_calls,
-                name="Calls Volume",
-                marker_color='#1f77b4'
-            ))
-            fig_vol.add_trace(go.Bar(
-                x=strikes,
-                y=-vol_puts,
-                name="Puts Volume",
-                marker_color='#d62728'
-            ))
-            fig_vol.add_vline(
-                x=current_price,
-                line=dict(color="black", width=2, dash="dot")
-            )
-            fig_vol.update_layout(
-                title="Today's Volume by Strike",
-                barmode="relative",
-                height=400,
-                yaxis_title="Contracts",
-                hovermode="x unified"
+        if not selected_tickers_agg:
+            st.warning("Please select at least one ticker")
+        else:
+            # Time selection
+            time_range = st.selectbox(
+                "Time range",
+                ["1d", "5d", "1mo", "3mo", "6mo"],
+                index=2
             )
-            st.plotly_chart(fig_vol, use_container_width=True)
-        
-        # Key levels and recommendations
-        st.subheader("Key Levels and Market Analysis")
-        
-        # Calculate key levels from mock data
-        max_gamma = strikes[np.argmax(np.abs(gamma))]
-        zero_gamma = strikes[np.argmin(np.abs(gamma))]
-        max_oi = strikes[np.argmax(oi_calls + oi_puts)]
-        
-        col3, col4 = st.columns(2)
-        
-        with col3:
-            st.markdown("""
-            **Key Gamma Levels:**
-            - Max Gamma: {:.0f}
-            - Zero Gamma: {:.0f}
-            - Current Price: {:.0f}
-            
-            **Open Interest:**
-            - Highest OI Strike: {:.0f}
-            - Call Wall: {:.0f}
-            - Put Wall: {:.0f}
-            """.format(
-                max_gamma, zero_gamma, current_price,
-                max_oi,
-                strikes[np.argmax(oi_calls)],
-                strikes[np.argmax(oi_puts)]
-            ))
-        
-        with col4:
-            st.markdown("""
-            **Market Implications:**
-            - Strong gamma resistance at {:.0f}
-            - Support zone between {:.0f}-{:.0f}
-            - Expected dealer hedging between {:.0f}-{:.0f}
-            
-            **Trading Recommendation:**
-            - Consider spreads around {:.0f} gamma level
-            - Watch for pinning at {:.0f} OI strike
-            - Monitor delta hedging flows above {:.0f}
-            """.format(
-                max_gamma,
-                zero_gamma - 50, zero_gamma,
-                current_price - 30, current_price + 30,
-                zero_gamma,
-                max_oi,
-                current_price + 50
-            ))
+            # Lookback and time bucket for the exposure history of each range
+            history_windows = {
+                '1d': (pd.Timedelta(days=1), '5min'),
+                '5d': (pd.Timedelta(days=5), '30min'),
+                '1mo': (pd.Timedelta(days=31), '2h'),
+                '3mo': (pd.Timedelta(days=92), '1D'),
+                '6mo': (pd.Timedelta(days=183), '1D'),
+            }
+            
+            # Common strike grid: moneyness, or equivalent strikes of one selected ticker
+            grid_options = ['Moneyness (%)'] + [f"{t}-equivalent strike" for t in selected_tickers_agg]
+            default_grid = 1 + (selected_tickers_agg.index('SPX') if 'SPX' in selected_tickers_agg else 0)
+            grid_choice = st.selectbox("Strike grid", grid_options, index=default_grid)
+            
+            # Load every expiration of every selected ticker concurrently
+            # Previous results let unchanged contracts skip the recompute
+            previous_exposures = st.session_state.setdefault('exposures', {})
+            exposures = {}
+            jobs = [(ticker, {'previous': previous_exposures.get(ticker), 'ticker_factory': PolledTicker})
+                    for ticker in selected_tickers_agg]
+            for ticker, data, error in iter_tickers(jobs, loader=load_ticker_exposure, max_workers=max_workers):
+                if error is not None:
+                    st.warning(f"Skipping {ticker}: {str(error)}")
+                else:
+                    exposures[ticker] = previous_exposures[ticker] = data
+            
+            # Sum dealer exposure across tickers and expirations on the moneyness grid
+            aggregated = aggregate_exposure((data.current_price, data.chain) for data in exposures.values())
+            reference = grid_choice.replace("-equivalent strike", "")
+            if reference in exposures:
+                current_price = exposures[reference].current_price
+                aggregated = to_reference_strikes(aggregated, current_price)
+                x_title = f"{reference}-Equivalent Strike"
+            else:
+                current_price = 100.0
+                aggregated = to_reference_strikes(aggregated, current_price)
+                x_title = "Moneyness (% of spot)"
+            
+            strikes = aggregated.index.to_numpy()
+            gamma = aggregated['gamma_exposure'].to_numpy()
+            oi_calls = aggregated['call_oi'].to_numpy()
+            oi_puts = aggregated['put_oi'].to_numpy()
+            
+            # Main exposure chart, one y axis per greek
+            show_chart(exposure_figure(aggregated, current_price, x_title))
+            
+            # Create OI/Volume charts in columns
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                show_chart(strike_totals_figure(strikes, oi_calls, oi_puts, current_price,
+                                                "Open Interest by Strike", "OI"))
+            
+            with col2:
+                show_chart(strike_totals_figure(strikes, aggregated['call_volume'].to_numpy(),
+                                                aggregated['put_volume'].to_numpy(), current_price,
+                                                "Today's Volume by Strike", "Volume"))
+            
+            # Exposure history from stored snapshots over the selected time range
+            history_metric = st.selectbox("History metric", ['Gamma Exposure', 'Open Interest'])
+            lookback, bucket = history_windows[time_range]
+            start = pd.Timestamp.now(tz='US/Eastern') - lookback
+            history_column = 'gamma_exposure' if history_metric == 'Gamma Exposure' else 'open_interest'
+            # Per ticker histories (cached until a new snapshot lands) summed on the common grid
+            histories = [history for history in (exposure_history(ticker, history_column, start, bucket)
+                                                  for ticker in exposures) if not history.empty]
+            history = pd.concat(histories).groupby(level=0).sum() if histories else pd.DataFrame()
+            
+            if history.empty:
+                st.info(f"No stored snapshots in the last {time_range} yet; history builds up as the page refreshes")
+            else:
+                show_chart(history_figure(history, history.columns.to_numpy() * current_price,
+                                          f"{history_metric} by Strike, last {time_range}", x_title,
+                                          zmid=0 if history_column == 'gamma_exposure' else None))
+            
+            # Key levels and recommendations
+            st.subheader("Key Levels and Market Analysis")
+            
+            # Calculate key levels from the aggregated exposure
+            max_gamma = strikes[np.argmax(np.abs(gamma))]
+            # Zero gamma from sweeping every ticker's spot by the same relative move
+            moves, gamma_sweep = combined_gamma_profile((data.current_price, data.chain) for data in exposures.values())
+            zero_move = zero_crossing(moves, gamma_sweep, 1.0)
+            zero_gamma = zero_move * current_price if zero_move is not None else None
+            if zero_gamma is not None:
+                zero_gamma_text = f"{zero_gamma:.0f}"
+                support_text = f"Support zone between {zero_gamma - current_price * 0.0125:.0f}-{zero_gamma:.0f}"
+                spreads_text = f"Consider spreads around {zero_gamma:.0f} gamma level"
+            else:
+                # No sign change inside the sweep: there is no flip point to anchor on
+                zero_gamma_text = "none within ±15%"
+                support_text = "No gamma flip within ±15% of spot"
+                spreads_text = f"Consider spreads around the {max_gamma:.0f} max gamma strike"
+            max_oi = strikes[np.argmax(oi_calls + oi_puts)]
+            
+            col3, col4 = st.columns(2)
+            
+            with col3:
+                st.markdown("""
+                **Key Gamma Levels:**
+                - Max Gamma: {:.0f}
+                - Zero Gamma: {}
+                - Current Price: {:.0f}
+                
+                **Open Interest:**
+                - Highest OI Strike: {:.0f}
+                - Call Wall: {:.0f}
+                - Put Wall: {:.0f}
+                """.format(
+                    max_gamma, zero_gamma_text, current_price,
+                    max_oi,
+                    strikes[np.argmax(oi_calls)],
+                    strikes[np.argmax(oi_puts)]
+                ))
+            
+            with col4:
+                st.markdown("""
+                **Market Implications:**
+                - Strong gamma resistance at {:.0f}
+                - {}
+                - Expected dealer hedging between {:.0f}-{:.0f}
+                
+                **Trading Recommendation:**
+                - {}
+                - Watch for pinning at {:.0f} OI strike
+                - Monitor delta hedging flows above {:.0f}
+                """.format(
+                    max_gamma,
+                    support_text,
+                    current_price * 0.9925, current_price * 1.0075,
+                    spreads_text,
+                    max_oi,
+                    current_price * 1.0125
+                ))
+
+
+    with tab2:
+        st.fragment(render_aggregated, run_every=refresh_every)()
+finally:
+    # Also when the run is interrupted (st.rerun, a widget change), so it is logged and
+    # a profiled run does not leave cProfile enabled on the script thread
+    metrics.end_run(page_run)
+
+if show_debug:
+    with debug_panel:
+        render_debug(page_run)
@@ -0,0 +1,255 @@
+"""Backtest of the dashboard's key levels against stored snapshots.
+
+Every chain snapshot in the snapshot store (see stocks/snapshot_store.py) is
+replayed: zero gamma, call wall, put wall and max pain are recomputed for each
+expiry bucket (0DTE, weekly, monthly and LEAPS, as in the app's analysis) and
+scored against what price did next:
+
+- a level at or below spot is a support, above spot a resistance;
+- it was touched if price came within --tolerance of it before the end of
+  the horizon, and it held if it was touched and price closed the horizon on
+  its side.
+
+The rest of the snapshot's session comes from the spots of that day's later
+exposure snapshots and its close from stock.history; longer horizons add the
+following daily bars.
+
+Days stream through a generator pipeline: each day is read one snapshot file
+at a time in a worker process, at most two days per process are in flight,
+and hit counts are accumulated as days complete, so memory stays flat however
+many months are replayed. Scored levels can be streamed to Parquet or CSV.
+
+    python backtest.py SPY SPX --start 2026-07-01 -o levels.parquet
+    python backtest.py QQQ --horizon 5 --tolerance 0.002 --summary summary.csv
+"""
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from itertools import groupby, islice
+
+import numpy as np
+import pandas as pd
+
+from stocks.key_levels import key_levels
+from stocks.market_data import CachedTicker
+from stocks.max_pain import max_pain
+from stocks.results import ResultWriter
+from stocks.snapshot_store import SnapshotStore, STORE_DIR, TIMEZONE
+
+# Expiry buckets and their largest calendar days to expiration
+EXPIRY_BUCKETS = ['0DTE', 'weekly', 'monthly', 'LEAPS']
+BUCKET_LIMITS = [0, 7, 30]
+
+LEVELS = ['zero_gamma', 'call_wall', 'put_wall', 'max_pain']
+
+# Chain snapshot columns key_levels and max_pain need
+CHAIN_COLUMNS = ['strike', 'openInterest', 'impliedVolatility', 'is_call', 'expiration', 't', 'gamma_exposure']
+
+# Price within this fraction of a level counts as a touch
+TOLERANCE = 0.001
+
+# Seconds between a chain snapshot and the exposure snapshot giving its spot
+MAX_SPOT_GAP = 300
+
+# stock.history periods and the calendar days they cover, shortest first
+HISTORY_PERIODS = [('1mo', 30), ('3mo', 91), ('6mo', 182), ('1y', 365), ('2y', 730), ('5y', 1826),
+                   ('max', np.inf)]
+
+
+def _day(path):
+    # Snapshot files are partitioned by date directory
+    return os.path.basename(os.path.dirname(path))
+
+
+def snapshot_days(store, ticker, start=None, end=None):
+    """Yield (ticker, date, chain paths, exposure paths) for each stored day, oldest first."""
+    exposures = {date: list(paths) for date, paths in groupby(store.files('exposure', ticker, start, end), key=_day)}
+    for date, paths in groupby(store.files('chain', ticker, start, end), key=_day):
+        yield ticker, date, list(paths), exposures.get(date, [])
+
+
+def day_levels(root, ticker, date, chain_paths, exposure_paths):
+    """Levels per expiry bucket of every chain snapshot of one day (runs in a worker process).
+
+    Returns (rows, snapshots). Each row also carries the high and low of the
+    spots stored after its snapshot, for the rest of the session.
+    """
+    store = SnapshotStore(root)
+    if not exposure_paths:
+        return [], 0
+    spots = pd.concat([store.read_file(path, ['spot']).iloc[:1] for path in exposure_paths])
+    times = pd.DatetimeIndex(spots['snapshot_time']).as_unit('ns').asi8 / 1e9
+    values = spots['spot'].to_numpy(dtype=float)
+
+    rows = []
+    snapshots = 0
+    for chain in (store.read_file(path, CHAIN_COLUMNS) for path in chain_paths):
+        taken = chain['snapshot_time'].iloc[0]
+        nearest = np.abs(times - taken.timestamp()).argmin()
+        if abs(times[nearest] - taken.timestamp()) > MAX_SPOT_GAP:
+            continue
+        snapshots += 1
+        spot = values[nearest]
+        later = values[times > taken.timestamp()]
+        after_high, after_low = (later.max(), later.min()) if len(later) else (np.nan, np.nan)
+
+        codes, expirations = pd.factorize(chain['expiration'].astype(str), sort=True)
+        days = (pd.to_datetime(expirations) - pd.Timestamp(date)).days.to_numpy()
+        buckets = np.where(days >= 0, np.searchsorted(BUCKET_LIMITS, days), -1)
+        for b, bucket in enumerate(EXPIRY_BUCKETS):
+            members = np.flatnonzero(buckets == b)
+            if not len(members):
+                continue
+            sub = chain[np.isin(codes, members)]
+            if not sub['openInterest'].sum() > 0:
+                # No positions to hedge: every level would be a placeholder strike
+                continue
+            levels = key_levels(sub, spot)
+            # Max pain of the bucket's nearest expiration
+            prices = {'zero_gamma': levels.zero_gamma, 'call_wall': levels.call_wall,
+                      'put_wall': levels.put_wall, 'max_pain': max_pain(sub)['max_pain'].iloc[0]}
+            for level, price in prices.items():
+                if price is None or not np.isfinite(price):
+                    continue
+                rows.append({'ticker': ticker, 'date': date, 'snapshot_time': taken, 'bucket': bucket,
+                             'expiration': expirations[members[0]], 'level': level, 'price': float(price),
+                             'spot': float(spot), 'after_high': after_high, 'after_low': after_low})
+    return rows, snapshots
+
+
+def price_bars(ticker, start, ticker_factory=CachedTicker):
+    """Daily High/Low/Close from stock.history, indexed by date, from `start` on."""
+    days = (pd.Timestamp.now(tz=TIMEZONE).tz_localize(None) - pd.Timestamp(start)).days + 7
+    period = next(name for name, length in HISTORY_PERIODS if length >= days)
+    history = ticker_factory(ticker).history(period=period)
+    index = history.index.tz_convert(TIMEZONE) if history.index.tz is not None else history.index
+    return history[['High', 'Low', 'Close']].set_axis(index.strftime('%Y-%m-%d'))
+
+
+def score_levels(levels, bars, horizon=1, tolerance=TOLERANCE, today=None):
+    """Add side, touched, held and close to one day's level rows.
+
+    Returns None while the horizon has not closed yet (or the day has no bar).
+    """
+    today = today or pd.Timestamp.now(tz=TIMEZONE).strftime('%Y-%m-%d')
+    date = levels['date'].iloc[0]
+    if date not in bars.index:
+        return None
+    i = bars.index.get_loc(date)
+    window = bars.iloc[i:i + horizon]
+    if len(window) < horizon or window.index[-1] >= today:
+        return None
+    # The snapshot day's own High/Low include the session before the snapshot
+    session_close = window['Close'].iloc[0]
+    high = np.fmax(levels['after_high'].to_numpy(), np.max(window['High'].to_numpy()[1:], initial=session_close))
+    low = np.fmin(levels['after_low'].to_numpy(), np.min(window['Low'].to_numpy()[1:], initial=session_close))
+    close = window['Close'].iloc[-1]
+
+    price = levels['price'].to_numpy()
+    support = price <= levels['spot'].to_numpy()
+    touched = np.where(support, low <= price * (1 + tolerance), high >= price * (1 - tolerance))
+    held = touched & np.where(support, close >= price, close <= price)
+    return levels.assign(side=np.where(support, 'support', 'resistance'), touched=touched, held=held,
+                         close=float(close))
+
+
+def summarize(counts):
+    """Hit-rate table per level and expiry bucket (plus 'all' buckets) from accumulated counts."""
+    frame = pd.DataFrame([(level, bucket, *count) for (level, bucket), count in counts.items()],
+                         columns=['level', 'bucket', 'levels', 'touched', 'held'])
+    totals = frame.groupby('level', as_index=False)[['levels', 'touched', 'held']].sum().assign(bucket='all')
+    frame = pd.concat([frame, totals], ignore_index=True)
+    frame['touch_rate'] = frame['touched'] / frame['levels']
+    frame['hit_rate'] = frame['held'] / frame['touched'].where(frame['touched'] > 0)
+    frame['level'] = pd.Categorical(frame['level'], LEVELS, ordered=True)
+    frame['bucket'] = pd.Categorical(frame['bucket'], EXPIRY_BUCKETS + ['all'], ordered=True)
+    return frame.sort_values(['level', 'bucket']).reset_index(drop=True)
+
+
+def backtest(tickers, start=None, end=None, root=STORE_DIR, horizon=1, tolerance=TOLERANCE, processes=None,
+             output=None, ticker_factory=CachedTicker, log=sys.stderr):
+    """Replay the stored snapshots of tickers; returns (summary, stats).
+
+    Scored level rows are streamed to `output` when given.
+    """
+    started = time.perf_counter()
+    store = SnapshotStore(root)
+    stats = {'days': 0, 'failed': 0, 'snapshots': 0, 'levels': 0, 'pending_days': 0}
+    counts = defaultdict(lambda: np.zeros(3, dtype=np.int64))
+    bars = {}
+
+    days = (day for ticker in tickers for day in snapshot_days(store, ticker, start, end))
+    max_inflight = 2 * (processes or os.cpu_count() or 1)
+    with ResultWriter(output) if output else nullcontext() as writer, \
+            ProcessPoolExecutor(max_workers=processes) as workers:
+        inflight = {}
+        while True:
+            # Keep the pool busy without reading ahead of it
+            for ticker, date, chain_paths, exposure_paths in islice(days, max_inflight - len(inflight)):
+                inflight[workers.submit(day_levels, root, ticker, date, chain_paths, exposure_paths)] = ticker, date
+            if not inflight:
+                break
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker, date = inflight.pop(future)
+                try:
+                    rows, snapshots = future.result()
+                    if ticker not in bars:
+                        first = _day(store.files('chain', ticker, start, end)[0])
+                        bars[ticker] = price_bars(ticker, first, ticker_factory)
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"{ticker} {date}: failed: {e}", file=log)
+                    continue
+                stats['days'] += 1
+                stats['snapshots'] += snapshots
+                scored = score_levels(pd.DataFrame(rows), bars[ticker], horizon, tolerance) if rows else None
+                if scored is None:
+                    stats['pending_days'] += bool(rows)
+                    continue
+                stats['levels'] += len(scored)
+                for (level, bucket), group in scored.groupby(['level', 'bucket']):
+                    counts[level, bucket] += [len(group), group['touched'].sum(), group['held'].sum()]
+                if writer is not None:
+                    writer.write(scored.to_dict('records'))
+                print(f"{ticker} {date}: {snapshots} snapshots, {len(scored)} levels", file=log)
+
+    stats['elapsed_seconds'] = time.perf_counter() - started
+    return summarize(counts), stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest key levels against stored snapshots")
+    parser.add_argument('tickers', nargs='+', help="ticker symbols")
+    parser.add_argument('--start', help="first day (YYYY-MM-DD, default the first stored day)")
+    parser.add_argument('--end', help="last day (YYYY-MM-DD, default the last stored day)")
+    parser.add_argument('--store-dir', default=STORE_DIR, help="snapshot store root")
+    parser.add_argument('--horizon', type=int, default=1,
+                        help="sessions each level is scored over, starting with the rest of its own")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="touch band as a fraction of price")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="days replayed in parallel")
+    parser.add_argument('-o', '--output', help="write every scored level to this .parquet or .csv file")
+    parser.add_argument('--summary', help="also write the hit-rate table to this .csv file")
+    args = parser.parse_args(argv)
+
+    start = pd.Timestamp(args.start).tz_localize(TIMEZONE) if args.start else None
+    end = (pd.Timestamp(args.end) + pd.Timedelta(days=1, microseconds=-1)).tz_localize(TIMEZONE) if args.end else None
+    summary, stats = backtest([t.upper() for t in args.tickers], start, end, root=args.store_dir,
+                              horizon=args.horizon, tolerance=args.tolerance, processes=args.processes,
+                              output=args.output)
+    print(f"Replayed {stats['days']} days ({stats['failed']} failed, {stats['pending_days']} not yet closed), "
+          f"{stats['snapshots']} snapshots, {stats['levels']} levels in {stats['elapsed_seconds']:.2f}s")
+    if summary.empty:
+        return 1
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.1%}"))
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Benchmarks for the data, greeks and aggregation hot paths.
+
+Generates synthetic option chains (1k to 1M contracts over many expirations)
+and times each stage separately: IV solve, greeks, per-strike binning,
+cross-ticker aggregation, key levels, max pain, IV surface fit, the spot x IV
+scenario grid of one expiration and figure construction.
+Results are appended as JSON lines tagged with the git commit so runs can be
+compared across commits.
+
+    python benchmark.py
+    python benchmark.py --sizes 1000 100000 --repeat 5 --only greeks binning
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from stocks.aggregate import aggregate_exposure
+from stocks.charts import exposure_figure, strike_bar_figure
+from stocks.greeks import dealer_exposure, exposure_by_strike, time_to_expiry
+from stocks.implied_vol import chain_implied_vol, price_and_vega
+from stocks.key_levels import key_levels
+from stocks.max_pain import max_pain
+from stocks.vol_surface import fit_chain
+from stocks.scenarios import scenario_grid
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_OUTPUT = 'benchmark_results.jsonl'
+
+
+def synthetic_chain(n_contracts, spot=5000.0, n_expirations=60, seed=0, now=None):
+    """A load_chain-shaped frame with quotes consistent with a volatility smile."""
+    rng = np.random.default_rng(seed)
+    now = now or pd.Timestamp.now(tz='US/Eastern')
+    dates = pd.bdate_range(now.normalize() + pd.Timedelta(days=1), periods=n_expirations * 3)[::3][:n_expirations]
+    expirations = np.asarray(dates.strftime('%Y-%m-%d'))
+
+    exp_idx = rng.integers(0, n_expirations, n_contracts)
+    # Priced on the same clock the pipeline uses, so solved IVs recover the smile
+    t = time_to_expiry(expirations, now=now)[exp_idx]
+    # Strikes on a 5 point grid, wider for longer dated expirations
+    width = 0.1 + 0.4 * np.sqrt(t)
+    strike = np.round(spot * np.exp(rng.normal(0.0, width / 2, n_contracts)) / 5.0) * 5.0
+    is_call = rng.random(n_contracts) < 0.5
+    moneyness = np.log(strike / spot)
+    iv = 0.18 - 0.25 * moneyness + 0.8 * moneyness ** 2
+    price, _ = price_and_vega(spot, strike, t, iv, is_call)
+    spread = np.maximum(price * 0.02, 0.05)
+
+    return pd.DataFrame({
+        'contractSymbol': [f"SYN{i:07d}" for i in range(n_contracts)],
+        'strike': strike,
+        'lastPrice': price,
+        'bid': np.maximum(price - spread / 2, 0.0),
+        'ask': price + spread / 2,
+        'volume': rng.integers(0, 2_000, n_contracts).astype(float),
+        'openInterest': rng.integers(0, 20_000, n_contracts).astype(float),
+        'impliedVolatility': iv,
+        'is_call': is_call,
+        'expiration': expirations[exp_idx],
+    })
+
+
+def build_figures(by_strike, current_price):
+    """The tab 1 Gamma bar chart and tab 2 multi-axis chart, serialized."""
+    fig_bar = strike_bar_figure(by_strike, 'Gamma', 'SYN', current_price)
+    fig_exposure = exposure_figure(by_strike, current_price, "Strike")
+    return fig_bar.to_json(), fig_exposure.to_json()
+
+
+def time_call(func, repeat):
+    """Run func `repeat` times; return (min, median) seconds and the last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), float(np.median(timings)), result
+
+
+def run_size(n_contracts, repeat, only=None, spot=5000.0):
+    """Time every stage for one chain size; returns one record per stage."""
+    chain = synthetic_chain(n_contracts, spot=spot)
+    iv = chain_implied_vol(chain, spot)
+    exposure = dealer_exposure(chain.assign(impliedVolatility=iv), spot)
+    by_strike = exposure_by_strike(exposure)
+    # Six underlyings of the same size for the cross-ticker aggregation
+    basket = [(spot * scale, exposure.assign(strike=exposure['strike'] * scale))
+              for scale in (1.0, 0.1, 3.6, 0.09, 0.4, 0.04)]
+    # The scenario grid reprices one expiration, like a ticker panel
+    expiration = exposure[exposure['expiration'] == exposure['expiration'].min()]
+
+    stages = {
+        'iv_solve': lambda: chain_implied_vol(chain, spot),
+        'greeks': lambda: dealer_exposure(chain, spot),
+        'binning': lambda: exposure_by_strike(exposure),
+        'aggregation': lambda: aggregate_exposure(basket),
+        'key_levels': lambda: key_levels(exposure, spot),
+        'max_pain': lambda: max_pain(chain),
+        'vol_surface': lambda: fit_chain(chain, spot),
+        'scenarios': lambda: scenario_grid(expiration, spot),
+        'figures': lambda: build_figures(by_strike, spot),
+    }
+    records = []
+    for stage, func in stages.items():
+        if only and stage not in only:
+            continue
+        best, median, _ = time_call(func, repeat)
+        records.append({'stage': stage, 'contracts': n_contracts, 'strikes': len(by_strike),
+                        'min_seconds': best, 'median_seconds': median, 'repeat': repeat})
+    return records
+
+
+def git_commit():
+    try:
+        # Run in the repository, wherever the benchmark is started from
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the exposure hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="contracts per chain")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage")
+    parser.add_argument('--only', nargs='+', help="stages to run (default all)")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help="JSON lines file to append to")
+    args = parser.parse_args(argv)
+
+    run = {'commit': git_commit(), 'timestamp': datetime.now().isoformat(timespec='seconds'),
+           'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()}
+    with open(args.output, 'a') as f:
+        for size in args.sizes:
+            for record in run_size(size, args.repeat, args.only):
+                record = {**run, **record}
+                f.write(json.dumps(record) + '\n')
+                print(f"{record['stage']:>12} {record['contracts']:>9} contracts: "
+                      f"min {record['min_seconds'] * 1000:9.2f} ms  median {record['median_seconds'] * 1000:9.2f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Headless exposure scanner.
+
+Runs the same chain -> IV -> greeks -> key levels pipeline as the dashboard
+for any number of tickers without a browser. Network fetches run on a thread
+pool; the CPU-bound stages of each fetched ticker go to a process pool as soon
+as its chains arrive. One summary row per ticker is streamed to a Parquet or
+CSV file as results complete, and throughput stats are printed at the end.
+
+    python scan.py SPY QQQ IWM -o scan.parquet
+    python scan.py --tickers-file universe.txt -o scan.csv --processes 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from stocks.greeks import load_chain, dealer_exposure, EXPOSURE_COLUMNS
+from stocks.implied_vol import chain_implied_vol
+from stocks.key_levels import key_levels
+from stocks.market_data import CachedTicker
+from stocks.max_pain import max_pain
+from stocks.pipeline import NoDataError, CHAIN_WORKERS
+from stocks.results import ResultWriter
+
+FETCH_WORKERS = 8
+
+
+def fetch(ticker, max_expirations=None):
+    """Spot and raw chains of one ticker (I/O bound, runs on a thread)."""
+    stock = CachedTicker(ticker)
+    hist = stock.history(period="1d")
+    if hist.empty:
+        raise NoDataError(f"No data available for {ticker}")
+    expirations = tuple(stock.options)[:max_expirations]
+    if not expirations:
+        raise NoDataError(f"No listed options for {ticker}")
+    return hist['Close'].iloc[-1], load_chain(stock, expirations, max_workers=CHAIN_WORKERS)
+
+
+def analyze(ticker, current_price, chain):
+    """IV, greeks, key levels and max pain for one ticker (runs in a worker process)."""
+    start = time.perf_counter()
+    chain = chain.assign(impliedVolatility=chain_implied_vol(chain, current_price))
+    exposure = dealer_exposure(chain, current_price)
+    levels = key_levels(exposure, current_price)
+    pain = max_pain(chain)
+    totals = exposure[EXPOSURE_COLUMNS].sum()
+    return {
+        'ticker': ticker,
+        'spot': float(current_price),
+        'contracts': len(chain),
+        'expirations': chain['expiration'].nunique(),
+        **{name: float(totals[name]) for name in EXPOSURE_COLUMNS},
+        'zero_gamma': np.nan if levels.zero_gamma is None else levels.zero_gamma,
+        'call_wall': np.nan if levels.call_wall is None else levels.call_wall,
+        'put_wall': np.nan if levels.put_wall is None else levels.put_wall,
+        'front_max_pain': float(pain['max_pain'].iloc[0]) if len(pain) else np.nan,
+        'compute_seconds': time.perf_counter() - start,
+    }
+
+
+def scan(tickers, output, processes=None, fetch_workers=FETCH_WORKERS, max_expirations=None,
+         batch_size=1, log=sys.stderr):
+    """Scan tickers into `output` and return throughput stats."""
+    started = time.perf_counter()
+    stats = {'tickers': len(tickers), 'ok': 0, 'failed': 0, 'contracts': 0, 'compute_seconds': 0.0}
+    pending_rows = []
+
+    with ResultWriter(output) as writer, \
+            ThreadPoolExecutor(max_workers=fetch_workers) as fetchers, \
+            ProcessPoolExecutor(max_workers=processes) as workers:
+        fetches = {fetchers.submit(fetch, ticker, max_expirations): ticker for ticker in tickers}
+        analyses = {}
+        pending = set(fetches)
+        # Hand each ticker to the process pool as soon as its chains arrive and
+        # write each result as soon as it is computed
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    ticker = fetches[future]
+                    try:
+                        current_price, chain = future.result()
+                    except Exception as e:
+                        stats['failed'] += 1
+                        print(f"{ticker}: fetch failed: {e}", file=log)
+                        continue
+                    analysis = workers.submit(analyze, ticker, current_price, chain)
+                    analyses[analysis] = ticker
+                    pending.add(analysis)
+                    continue
+
+                ticker = analyses[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    stats['failed'] += 1
+                    print(f"{ticker}: compute failed: {e}", file=log)
+                    continue
+                stats['ok'] += 1
+                stats['contracts'] += row['contracts']
+                stats['compute_seconds'] += row['compute_seconds']
+                print(f"{ticker}: {row['contracts']} contracts in {row['compute_seconds']:.3f}s", file=log)
+                pending_rows.append(row)
+                if len(pending_rows) >= batch_size:
+                    writer.write(pending_rows)
+                    pending_rows = []
+
+        if pending_rows:
+            writer.write(pending_rows)
+
+    elapsed = time.perf_counter() - started
+    stats['elapsed_seconds'] = elapsed
+    stats['tickers_per_second'] = stats['ok'] / elapsed if elapsed else 0.0
+    stats['contracts_per_second'] = stats['contracts'] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan option chains for dealer exposure and key levels")
+    parser.add_argument('tickers', nargs='*', help="ticker symbols")
+    parser.add_argument('--tickers-file', help="file with one ticker per line")
+    parser.add_argument('-o', '--output', default='scan.parquet', help="output .parquet or .csv file")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="compute processes")
+    parser.add_argument('--fetch-workers', type=int, default=FETCH_WORKERS, help="concurrent fetches")
+    parser.add_argument('--max-expirations', type=int, help="nearest expirations per ticker (default all)")
+    parser.add_argument('--batch-size', type=int, default=16, help="rows per output write")
+    args = parser.parse_args(argv)
+
+    tickers = [t.upper() for t in args.tickers]
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip().upper() for line in f if line.strip() and not line.startswith('#')]
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        parser.error("no tickers given")
+
+    stats = scan(tickers, args.output, processes=args.processes, fetch_workers=args.fetch_workers,
+                 max_expirations=args.max_expirations, batch_size=args.batch_size)
+    print(f"Scanned {stats['ok']}/{stats['tickers']} tickers ({stats['failed']} failed), "
+          f"{stats['contracts']} contracts in {stats['elapsed_seconds']:.2f}s: "
+          f"{stats['tickers_per_second']:.2f} tickers/s, {stats['contracts_per_second']:.0f} contracts/s, "
+          f"{stats['compute_seconds']:.2f}s total compute")
+    return 0 if stats['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
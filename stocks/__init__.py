@@ -0,0 +1,7 @@
+"""Data access, analytics and chart building behind the Streamlit app.
+
+Import the submodules directly (``from stocks.pipeline import load_ticker``);
+this package deliberately imports nothing so that scripts and worker
+processes only pay for the modules they use. yfinance, plotly and pyarrow
+are imported lazily on the code paths that need them.
+"""
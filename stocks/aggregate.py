@@ -0,0 +1,101 @@
+"""Cross-ticker aggregation of dealer exposure onto a common strike grid.
+
+Strikes from different underlyings are not comparable directly, so each
+contract is mapped to its moneyness (strike / spot of its own underlying)
+and binned onto a shared moneyness grid. The grid can then be expressed as
+moneyness percent or as equivalent strikes of a reference ticker (e.g. SPX).
+All binning is a single bincount per column over every contract.
+"""
+import numpy as np
+import pandas as pd
+
+from .greeks import EXPOSURE_COLUMNS
+
+# Default moneyness window and bin width (0.25% of spot)
+MONEYNESS_LOW = 0.8
+MONEYNESS_HIGH = 1.2
+BIN_WIDTH = 0.0025
+
+AGGREGATE_COLUMNS = ['call_oi', 'put_oi', 'call_volume', 'put_volume'] + EXPOSURE_COLUMNS
+
+
+def moneyness_grid(low=MONEYNESS_LOW, high=MONEYNESS_HIGH, width=BIN_WIDTH):
+    """Centres of the moneyness bins covering [low, high)."""
+    n = int(round((high - low) / width))
+    return low + width * (np.arange(n) + 0.5)
+
+
+def aggregate_exposure(exposures, low=MONEYNESS_LOW, high=MONEYNESS_HIGH, width=BIN_WIDTH):
+    """Sum dealer exposure and OI/volume of many tickers onto one moneyness grid.
+
+    `exposures` is an iterable of (current_price, dealer_exposure frame) pairs,
+    covering any number of expirations each. Contracts outside the window are
+    dropped. Returns a frame indexed by bin centre moneyness.
+    """
+    moneyness, is_call, columns = [], [], []
+    for current_price, chain in exposures:
+        moneyness.append(chain['strike'].to_numpy(dtype=float) / current_price)
+        is_call.append(chain['is_call'].to_numpy(dtype=bool))
+        columns.append(chain[['openInterest', 'volume'] + EXPOSURE_COLUMNS].to_numpy(dtype=float))
+
+    grid = moneyness_grid(low, high, width)
+    n = len(grid)
+    if not moneyness:
+        return pd.DataFrame(0.0, index=pd.Index(grid, name='moneyness'), columns=AGGREGATE_COLUMNS)
+
+    moneyness = np.concatenate(moneyness)
+    is_call = np.concatenate(is_call)
+    columns = np.nan_to_num(np.concatenate(columns))
+
+    bins = np.floor((moneyness - low) / width).astype(np.int64)
+    keep = (bins >= 0) & (bins < n)
+    bins, is_call, columns = bins[keep], is_call[keep], columns[keep]
+
+    oi, volume, exposure = columns[:, 0], columns[:, 1], columns[:, 2:]
+    values = np.column_stack([
+        np.where(is_call, oi, 0.0),
+        np.where(is_call, 0.0, oi),
+        np.where(is_call, volume, 0.0),
+        np.where(is_call, 0.0, volume),
+        exposure,
+    ])
+    # Offset each column into its own block of bins so one bincount sums them all
+    offsets = (bins[:, None] + n * np.arange(values.shape[1])[None, :]).ravel()
+    summed = np.bincount(offsets, weights=values.ravel(), minlength=n * values.shape[1])
+    return pd.DataFrame(summed.reshape(values.shape[1], n).T,
+                        index=pd.Index(grid, name='moneyness'), columns=AGGREGATE_COLUMNS)
+
+
+def to_reference_strikes(aggregated, reference_price):
+    """Re-label a moneyness-indexed aggregate in strikes of a reference spot."""
+    out = aggregated.copy()
+    out.index = pd.Index(aggregated.index.to_numpy() * reference_price, name='strike')
+    return out
+
+
+def aggregate_history(snapshots, column, freq, low=MONEYNESS_LOW, high=MONEYNESS_HIGH, width=BIN_WIDTH):
+    """Bin stored per-strike snapshots of many tickers into a time x moneyness grid.
+
+    `snapshots` has ticker, snapshot_time, strike, spot and `column` columns.
+    Times are floored to `freq`; within a bucket only each ticker's latest
+    snapshot counts so repeated snapshots are not summed twice. Returns a
+    frame indexed by bucket time with one column per moneyness bin centre.
+    """
+    grid = moneyness_grid(low, high, width)
+    if snapshots.empty:
+        return pd.DataFrame(columns=grid)
+
+    times = pd.to_datetime(snapshots['snapshot_time'])
+    bucket = times.dt.floor(freq)
+    latest = times.groupby([snapshots['ticker'].to_numpy(), bucket.to_numpy()]).transform('max')
+    keep = (times == latest).to_numpy()
+
+    bucket_codes, buckets = pd.factorize(bucket[keep], sort=True)
+    moneyness = snapshots['strike'].to_numpy(dtype=float)[keep] / snapshots['spot'].to_numpy(dtype=float)[keep]
+    bins = np.floor((moneyness - low) / width).astype(np.int64)
+    inside = (bins >= 0) & (bins < len(grid))
+
+    cells = bucket_codes[inside] * len(grid) + bins[inside]
+    values = np.nan_to_num(snapshots[column].to_numpy(dtype=float)[keep][inside])
+    summed = np.bincount(cells, weights=values, minlength=len(buckets) * len(grid))
+    return pd.DataFrame(summed.reshape(len(buckets), len(grid)), index=buckets, columns=grid)
@@ -0,0 +1,276 @@
+"""Chart data preparation and Plotly figure builders.
+
+Long price histories are reduced to roughly one point per horizontal pixel
+before they are sent to the browser, and long histories switch to WebGL, so
+chart payloads stay about the same size whatever the timeframe. Plotly is
+imported by the figure builders, not by this module.
+"""
+import numpy as np
+
+from .downsample import lttb, min_max
+from .market_data import TTLCache, next_market_close
+
+# Assumed plot width in pixels for the price chart column of the wide layout
+CHART_WIDTH_PX = 900
+
+# Series with more points than this (before reduction) are drawn with Scattergl
+WEBGL_THRESHOLD = 1000
+
+# Reduced series, per ticker / timeframe / width, kept in memory only
+series_cache = TTLCache(max_entries=256, cache_dir=None)
+
+
+def reduce_series(x, y, width_px=CHART_WIDTH_PX, method='lttb'):
+    """Positions of the points to draw for a chart width_px pixels wide."""
+    if method == 'minmax':
+        return min_max(y, width_px // 2)
+    return lttb(x, y, width_px)
+
+
+def price_series(ticker, period, price_data, width_px=CHART_WIDTH_PX, method='lttb'):
+    """Downsampled (dates, closes) of a price history, cached per ticker/timeframe.
+
+    The cache key includes the last bar so a new close invalidates it.
+    """
+    close = price_data['Close'].dropna()
+    if close.empty:
+        return close.index, close.to_numpy()
+    key = (ticker, period, width_px, method, len(close), close.index[-1], float(close.iloc[-1]))
+
+    def fetch():
+        x = close.index.asi8 if hasattr(close.index, 'asi8') else np.arange(len(close))
+        keep = reduce_series(x, close.to_numpy(), width_px, method)
+        return close.index[keep], close.to_numpy()[keep]
+
+    return series_cache.get_or_fetch(key, fetch, expires_at=next_market_close())
+
+
+def line_trace(x, y, points=None, **kwargs):
+    """Scatter trace for x/y, using WebGL above WEBGL_THRESHOLD points.
+
+    `points` is the length of the series x/y were reduced from, if any.
+    """
+    import plotly.graph_objects as go
+
+    trace = go.Scattergl if (points or len(x)) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+CALL_COLOR = 'rgba(55, 128, 191, 0.7)'
+PUT_COLOR = 'rgba(255, 128, 191, 0.7)'
+
+# Bar chart metrics: (calls, puts) column pairs, or one signed exposure column
+STRIKE_METRICS = {
+    'Open Interest': ('call_oi', 'put_oi'),
+    'Traded Volume': ('call_volume', 'put_volume'),
+    'Delta': 'delta_exposure',
+    'Gamma': 'gamma_exposure',
+    'Vanna': 'vanna_exposure',
+    'Charm': 'charm_exposure',
+}
+
+# Aggregated exposure chart: column, label and color of each y axis
+EXPOSURE_AXES = [
+    ('gamma_exposure', "Gamma Exposure", '#1f77b4'),
+    ('delta_exposure', "Delta Exposure", '#ff7f0e'),
+    ('vanna_exposure', "Vanna Exposure", '#2ca02c'),
+    ('charm_exposure', "Charm Exposure", '#d62728'),
+]
+
+
+def price_figure(ticker, x, y, points=None):
+    """Line chart of a (downsampled) price history of `points` bars."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(line_trace(x, y, points, line=dict(color='royalblue', width=2), name='Price'))
+    fig.update_layout(
+        title=f"{ticker} Price Chart",
+        xaxis_title="Date",
+        yaxis_title="Price",
+        hovermode="x unified"
+    )
+    return fig
+
+
+def strike_bar_figure(by_strike, metric, ticker, current_price):
+    """Horizontal bars of one STRIKE_METRICS metric per strike.
+
+    Open interest and volume show calls right and puts left; exposures are
+    colored by sign.
+    """
+    import plotly.graph_objects as go
+
+    strikes = by_strike.index.to_numpy()
+    columns = STRIKE_METRICS[metric]
+    fig = go.Figure()
+    if isinstance(columns, tuple):
+        suffix = ' Volume' if metric == 'Traded Volume' else ''
+        fig.add_trace(go.Bar(y=strikes, x=by_strike[columns[0]].to_numpy(), name='Calls' + suffix,
+                             orientation='h', marker_color=CALL_COLOR))
+        fig.add_trace(go.Bar(y=strikes, x=-by_strike[columns[1]].to_numpy(), name='Puts' + suffix,
+                             orientation='h', marker_color=PUT_COLOR))
+        fig.update_layout(barmode='relative')
+    else:
+        values = by_strike[columns].to_numpy()
+        fig.add_trace(go.Bar(y=strikes, x=values, orientation='h',
+                             marker_color=np.where(values > 0, CALL_COLOR, PUT_COLOR)))
+
+    fig.add_vline(x=0, line_width=0.5, line_color="gray")
+    fig.add_hline(y=current_price, line_dash="dot", line_color="black", line_width=2)
+    fig.update_layout(
+        title=f"{metric} Exposure for {ticker}",
+        yaxis_title="Strike Price",
+        xaxis_title=metric,
+        showlegend=isinstance(columns, tuple),
+        height=600
+    )
+    return fig
+
+
+def max_pain_figure(ticker, pain, current_price):
+    """Max pain strike per expiration, from max_pain.max_pain."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=pain['expiration'],
+        y=pain['max_pain'],
+        mode='lines+markers',
+        line=dict(color='royalblue', width=2),
+        name='Max Pain'
+    ))
+    fig.add_hline(y=current_price, line_dash="dot", line_color="black", line_width=2)
+    fig.update_layout(
+        title=f"{ticker} Max Pain by Expiration",
+        xaxis_title="Expiration",
+        yaxis_title="Strike Price",
+        hovermode="x unified"
+    )
+    return fig
+
+
+def exposure_figure(aggregated, current_price, x_title):
+    """Gamma, delta, vanna and charm exposure per strike, one y axis each."""
+    import plotly.graph_objects as go
+
+    strikes = aggregated.index.to_numpy()
+    fig = go.Figure()
+    for i, (column, label, color) in enumerate(EXPOSURE_AXES):
+        fig.add_trace(go.Scatter(
+            x=strikes,
+            y=aggregated[column].to_numpy(),
+            name=label,
+            line=dict(color=color, width=2),
+            yaxis=f"y{i + 1}"
+        ))
+    fig.add_vline(
+        x=current_price,
+        line=dict(color="black", width=2, dash="dot"),
+        annotation_text="Current Price",
+        annotation_position="top right"
+    )
+
+    axes = {}
+    for i, (_, label, color) in enumerate(EXPOSURE_AXES):
+        axis = dict(title=dict(text=label, font=dict(color=color)), tickfont=dict(color=color))
+        if i == 0:
+            axis.update(side="left", position=0.05)
+        else:
+            axis.update(overlaying="y", side="right")
+            if i > 1:
+                axis['position'] = 0.65 + 0.1 * i
+        axes['yaxis' if i == 0 else f"yaxis{i + 1}"] = axis
+    fig.update_layout(
+        title="Aggregated Options Exposure Across Strikes",
+        xaxis_title=x_title,
+        hovermode="x unified",
+        height=600,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        **axes
+    )
+    return fig
+
+
+def strike_totals_figure(strikes, calls, puts, current_price, title, label):
+    """Vertical call (up) and put (down) bars per strike, e.g. OI or volume."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=strikes, y=calls, name=f"Calls {label}", marker_color='#1f77b4'))
+    fig.add_trace(go.Bar(x=strikes, y=-puts, name=f"Puts {label}", marker_color='#d62728'))
+    fig.add_vline(x=current_price, line=dict(color="black", width=2, dash="dot"))
+    fig.update_layout(
+        title=title,
+        barmode="relative",
+        height=400,
+        yaxis_title="Contracts",
+        hovermode="x unified"
+    )
+    return fig
+
+
+def surface_figure(surface, ticker, strike_range=0.3, points=121):
+    """Heatmap of a VolSurface's IV (%) by strike and expiration."""
+    import plotly.graph_objects as go
+
+    strikes = surface.spot * np.linspace(1 - strike_range, 1 + strike_range, points)
+    iv = surface.iv(strikes[None, :], surface.t[:, None])
+    fig = go.Figure(go.Heatmap(
+        x=strikes,
+        y=surface.expirations,
+        z=100 * iv,
+        colorscale='Viridis',
+        colorbar=dict(title="IV %")
+    ))
+    fig.add_vline(x=surface.spot, line_dash="dot", line_color="white", line_width=2)
+    fig.update_layout(
+        title=f"{ticker} Implied Volatility Surface",
+        xaxis_title="Strike Price",
+        yaxis_title="Expiration",
+        height=500
+    )
+    return fig
+
+
+def history_figure(history, strikes, title, x_title, zmid=None):
+    """Heatmap of a time x strike frame from aggregate.aggregate_history."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Heatmap(
+        x=strikes,
+        y=history.index,
+        z=history.to_numpy(),
+        colorscale='RdBu',
+        zmid=zmid
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title="Time", height=500)
+    return fig
+
+
+def scenario_figure(scenarios, metric, ticker, current_price):
+    """Heatmap of one exposure metric over scenarios.scenario_grid's spot x IV shock grid.
+
+    Spot runs up the y axis like the strike axis of strike_bar_figure, so the
+    two line up side by side.
+    """
+    import plotly.graph_objects as go
+
+    days = f", {scenarios.days:g}d forward" if scenarios.days else ""
+    fig = go.Figure(go.Heatmap(
+        x=scenarios.vol_shocks * 100,
+        y=scenarios.spots,
+        z=getattr(scenarios, STRIKE_METRICS[metric]),
+        colorscale='RdBu',
+        zmid=0,
+        colorbar=dict(title=metric)
+    ))
+    fig.add_vline(x=0, line_width=0.5, line_color="gray")
+    fig.add_hline(y=current_price, line_dash="dot", line_color="black", line_width=2)
+    fig.update_layout(
+        title=f"{metric} Scenarios for {ticker}{days}",
+        xaxis_title="IV Shock (vol points)",
+        yaxis_title="Spot Price",
+        height=600
+    )
+    return fig
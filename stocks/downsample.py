@@ -0,0 +1,59 @@
+"""Shape-preserving downsampling for line charts.
+
+Both functions return the positions of the points to keep, always including
+the first and last point, so the caller can slice x and y (or a whole frame).
+"""
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets selection of about n_out points.
+
+    Each middle bucket keeps the point forming the largest triangle with the
+    previously kept point and the average of the next bucket, which keeps
+    peaks and troughs that plain striding would drop.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Bucket averages from cumulative sums, with the last point as a final "bucket"
+    cx = np.r_[0.0, np.cumsum(x)]
+    cy = np.r_[0.0, np.cumsum(y)]
+    size = np.maximum(edges[1:] - edges[:-1], 1)
+    avg_x = np.r_[(cx[edges[1:]] - cx[edges[:-1]]) / size, x[-1]]
+    avg_y = np.r_[(cy[edges[1:]] - cy[edges[:-1]]) / size, y[-1]]
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nx, ny = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - nx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ny - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def min_max(y, n_buckets):
+    """Keep the minimum and maximum of each of n_buckets equal-count buckets.
+
+    Fully vectorized; returns at most 2 * n_buckets + 2 sorted positions.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * n_buckets >= n or n_buckets < 1:
+        return np.arange(n)
+
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.r_[starts, n]))
+    lows = np.minimum.reduceat(y, starts)[bucket] == y
+    highs = np.maximum.reduceat(y, starts)[bucket] == y
+    # First occurrence of each bucket's minimum and maximum
+    low_pos = np.flatnonzero(lows)[np.unique(bucket[lows], return_index=True)[1]]
+    high_pos = np.flatnonzero(highs)[np.unique(bucket[highs], return_index=True)[1]]
+    return np.unique(np.r_[0, low_pos, high_pos, n - 1])
@@ -0,0 +1,207 @@
+"""Vectorized Black-Scholes greeks and dealer exposure for option chains.
+
+Everything here works on whole NumPy arrays at once so a full chain (tens of
+thousands of contracts for SPX) is priced in a handful of array operations.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from .metrics import propagate
+
+# Contract multiplier for US listed equity/index options
+CONTRACT_SIZE = 100
+
+# Flat rate assumptions used when nothing better is supplied
+RISK_FREE_RATE = 0.04
+DIVIDEND_YIELD = 0.0
+
+# Floors that keep d1/d2 finite for expiring or badly quoted contracts
+MIN_TIME = 1.0 / (365.0 * 24.0)
+MIN_VOL = 0.01
+
+SECONDS_PER_YEAR = 365.0 * 24.0 * 3600.0
+
+# Columns kept from yfinance's option_chain frames
+CHAIN_COLUMNS = ['contractSymbol', 'strike', 'lastPrice', 'bid', 'ask',
+                 'volume', 'openInterest', 'impliedVolatility']
+
+EXPOSURE_COLUMNS = ['delta_exposure', 'gamma_exposure', 'vanna_exposure', 'charm_exposure']
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def chain_to_frame(chain, expiration):
+    """Flatten one yfinance option_chain result into a single contracts frame."""
+    calls = chain.calls.reindex(columns=CHAIN_COLUMNS)
+    puts = chain.puts.reindex(columns=CHAIN_COLUMNS)
+    frame = pd.concat([calls, puts], ignore_index=True)
+    frame['is_call'] = np.r_[np.ones(len(calls), dtype=bool), np.zeros(len(puts), dtype=bool)]
+    frame['expiration'] = expiration
+    frame[['volume', 'openInterest']] = frame[['volume', 'openInterest']].fillna(0)
+    return frame
+
+
+def load_chain(stock, expirations, max_workers=1):
+    """Fetch and concatenate the chains for one or more expirations.
+
+    With max_workers > 1 the expirations are requested on a thread pool.
+    """
+    if isinstance(expirations, str):
+        expirations = [expirations]
+    fetch = lambda exp: chain_to_frame(stock.option_chain(exp), exp)
+    if max_workers > 1 and len(expirations) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(expirations))) as pool:
+            frames = list(pool.map(propagate(fetch), expirations))
+    else:
+        frames = [fetch(exp) for exp in expirations]
+    if not frames:
+        return pd.DataFrame(columns=CHAIN_COLUMNS + ['is_call', 'expiration'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def time_to_expiry(expirations, now=None):
+    """Year fractions until the 16:00 US/Eastern close of each expiration date.
+
+    Only the distinct expiration strings are parsed, then broadcast back.
+    """
+    if now is None:
+        now = pd.Timestamp.now(tz='US/Eastern')
+    codes, unique = pd.factorize(np.asarray(expirations))
+    close = pd.to_datetime(unique).tz_localize('US/Eastern') + pd.Timedelta(hours=16)
+    years = (close - now).total_seconds().to_numpy() / SECONDS_PER_YEAR
+    return np.maximum(years[codes], MIN_TIME)
+
+
+def black_scholes_greeks(spot, strike, t, iv, is_call, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+    """Delta, gamma, vanna and charm for arrays of contracts.
+
+    Vanna is dDelta/dVol and charm is the decay of delta per year of elapsed
+    time. Contracts without a usable volatility come back as NaN.
+    """
+    strike = np.asarray(strike, dtype=float)
+    t = np.maximum(np.asarray(t, dtype=float), MIN_TIME)
+    iv = np.asarray(iv, dtype=float)
+    iv = np.where(iv > 0, np.maximum(iv, MIN_VOL), np.nan)
+    is_call = np.asarray(is_call, dtype=bool)
+
+    sqrt_t = np.sqrt(t)
+    vol_t = iv * sqrt_t
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (r - q + 0.5 * iv * iv) * t) / vol_t
+    d2 = d1 - vol_t
+
+    disc_q = np.exp(-q * t)
+    pdf_d1 = _INV_SQRT_2PI * np.exp(-0.5 * d1 * d1)
+    cdf_d1 = ndtr(d1)
+
+    delta = disc_q * np.where(is_call, cdf_d1, cdf_d1 - 1.0)
+    gamma = disc_q * pdf_d1 / (spot * vol_t)
+    vanna = -disc_q * pdf_d1 * d2 / iv
+    charm = (q * delta
+             - disc_q * pdf_d1 * (2.0 * (r - q) * t - d2 * vol_t) / (2.0 * t * vol_t))
+
+    return {'delta': delta, 'gamma': gamma, 'vanna': vanna, 'charm': charm}
+
+
+def dealer_exposure(chain, spot, now=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD, iv=None):
+    """Add per-contract greeks and dealer-signed exposure columns to a chain.
+
+    Dealers are assumed long calls and short puts (the usual GEX convention).
+    Exposures are in dollars: delta per contract notional, gamma per 1% spot
+    move, vanna per 1 vol point and charm per calendar day.
+    """
+    chain = chain.copy()
+    t = time_to_expiry(chain['expiration'].to_numpy(), now=now)
+    if iv is None:
+        iv = chain['impliedVolatility'].to_numpy(dtype=float)
+    is_call = chain['is_call'].to_numpy(dtype=bool)
+    greeks = black_scholes_greeks(spot, chain['strike'].to_numpy(dtype=float), t, iv, is_call, r=r, q=q)
+
+    position = np.where(is_call, 1.0, -1.0) * chain['openInterest'].to_numpy(dtype=float) * CONTRACT_SIZE
+    chain['t'] = t
+    for name, values in greeks.items():
+        chain[name] = values
+    chain['delta_exposure'] = np.nan_to_num(greeks['delta'] * position * spot)
+    chain['gamma_exposure'] = np.nan_to_num(greeks['gamma'] * position * spot * spot * 0.01)
+    chain['vanna_exposure'] = np.nan_to_num(greeks['vanna'] * position * spot * 0.01)
+    chain['charm_exposure'] = np.nan_to_num(greeks['charm'] * position * spot / 365.0)
+    return chain
+
+
+def bin_by_strike(strike, values):
+    """Sum each column of `values` into unique strike buckets.
+
+    Returns the sorted unique strikes and an array shaped (len(values), n_strikes).
+    """
+    strikes, inverse = np.unique(np.asarray(strike, dtype=float), return_inverse=True)
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    n = len(strikes)
+    # One bincount over a flattened (column, strike) index covers every column
+    offsets = (np.arange(values.shape[0])[:, None] * n + inverse[None, :]).ravel()
+    summed = np.bincount(offsets, weights=np.nan_to_num(values).ravel(), minlength=values.shape[0] * n)
+    return strikes, summed.reshape(values.shape[0], n)
+
+
+def exposure_by_strike(exposure):
+    """Aggregate a dealer_exposure frame into per-strike totals.
+
+    Output columns: call/put open interest and volume plus the four dealer
+    exposure sums, indexed by strike.
+    """
+    is_call = exposure['is_call'].to_numpy(dtype=bool)
+    oi = exposure['openInterest'].to_numpy(dtype=float)
+    volume = exposure['volume'].to_numpy(dtype=float)
+    columns = np.vstack([
+        np.where(is_call, oi, 0.0),
+        np.where(is_call, 0.0, oi),
+        np.where(is_call, volume, 0.0),
+        np.where(is_call, 0.0, volume),
+        exposure[EXPOSURE_COLUMNS].to_numpy(dtype=float).T,
+    ])
+    strikes, summed = bin_by_strike(exposure['strike'].to_numpy(), columns)
+    names = ['call_oi', 'put_oi', 'call_volume', 'put_volume'] + EXPOSURE_COLUMNS
+    return pd.DataFrame(summed.T, index=pd.Index(strikes, name='strike'), columns=names)
+
+
+# Quote fields whose change means a contract's IV and greeks must be recomputed
+DIFF_COLUMNS = ['bid', 'ask', 'lastPrice', 'openInterest', 'volume']
+
+
+def changed_contracts(previous, chain):
+    """Diff a fresh chain against the previous snapshot by contractSymbol.
+
+    Returns (changed, dirty_strikes): a mask over `chain` of new or requoted
+    contracts, and the strikes whose totals must be re-binned (those of
+    changed contracts plus those of contracts that disappeared).
+    """
+    prev = previous.drop_duplicates('contractSymbol').set_index('contractSymbol')
+    aligned = prev.reindex(chain['contractSymbol'])
+    old = aligned[DIFF_COLUMNS].to_numpy(dtype=float)
+    new = chain[DIFF_COLUMNS].to_numpy(dtype=float)
+    same = (old == new) | (np.isnan(old) & np.isnan(new))
+    changed = aligned['strike'].isna().to_numpy() | ~same.all(axis=1)
+
+    gone = ~prev.index.isin(chain['contractSymbol'])
+    dirty = np.union1d(chain['strike'].to_numpy(dtype=float)[changed], prev['strike'].to_numpy(dtype=float)[gone])
+    return changed, dirty
+
+
+def patch_exposure(previous, chain, changed, fresh):
+    """Assemble a dealer_exposure frame for `chain` from reused and fresh rows.
+
+    Unchanged contracts are copied from `previous`; `fresh` is the
+    dealer_exposure of chain[changed].
+    """
+    prev = previous.drop_duplicates('contractSymbol').set_index('contractSymbol')
+    reused = prev.reindex(chain.loc[~changed, 'contractSymbol']).reset_index()
+    reused.index = chain.index[~changed]
+    return pd.concat([reused, fresh]).sort_index()[previous.columns]
+
+
+def patch_by_strike(by_strike, exposure, strikes):
+    """Re-bin only `strikes` of an exposure_by_strike frame."""
+    part = exposure_by_strike(exposure[exposure['strike'].isin(strikes)])
+    return pd.concat([by_strike[~by_strike.index.isin(strikes)], part]).sort_index()
@@ -0,0 +1,123 @@
+"""Gamma flip and gamma wall levels from a spot sweep.
+
+Total dealer gamma exposure is re-evaluated at every point of a grid of
+hypothetical spot prices as one contracts x spots matrix computation. The
+contracts are processed in chunks so the matrix never exceeds MAX_CELLS
+entries, whatever the chain size. The zero-gamma level is where the swept
+profile changes sign; the call and put walls are the strikes carrying the
+largest call and put gamma exposure.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .greeks import CONTRACT_SIZE, RISK_FREE_RATE, DIVIDEND_YIELD, bin_by_strike
+
+# Default sweep: +/- 15% around spot in 301 steps
+SWEEP_RANGE = 0.15
+SWEEP_POINTS = 301
+
+# Bound on contracts x spots cells evaluated at once (float64 -> ~32MB)
+MAX_CELLS = 4_000_000
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+KeyLevels = namedtuple('KeyLevels', ['zero_gamma', 'call_wall', 'put_wall', 'spots', 'profile'])
+
+
+def sweep_moves(sweep_range=SWEEP_RANGE, points=SWEEP_POINTS):
+    """Relative spot multipliers centred on 1.0."""
+    return np.linspace(1.0 - sweep_range, 1.0 + sweep_range, points)
+
+
+def gamma_profile(chain, spot, moves=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD, max_cells=MAX_CELLS):
+    """Total dealer gamma exposure ($ per 1% move) at spot * moves.
+
+    `chain` is a dealer_exposure frame; times to expiry and IVs are held
+    fixed across the sweep. Returns (spots, profile).
+    """
+    if moves is None:
+        moves = sweep_moves()
+    spots = spot * np.asarray(moves, dtype=float)
+    profile = np.zeros(len(spots))
+
+    is_call = chain['is_call'].to_numpy(dtype=bool)
+    weight = np.where(is_call, 1.0, -1.0) * chain['openInterest'].to_numpy(dtype=float) * CONTRACT_SIZE
+    iv = chain['impliedVolatility'].to_numpy(dtype=float)
+    t = chain['t'].to_numpy(dtype=float)
+    strike = chain['strike'].to_numpy(dtype=float)
+    keep = (weight != 0) & np.isfinite(iv) & (iv > 0) & (strike > 0)
+    if not keep.any() or len(spots) == 0:
+        return spots, profile
+
+    weight, iv, t, strike = weight[keep], iv[keep], t[keep], strike[keep]
+    vol_t = iv * np.sqrt(t)
+    # d1 = (log S - shift) / vol_t, with everything but log S precomputed per contract
+    shift = np.log(strike) - (r - q + 0.5 * iv * iv) * t
+    coef = weight * np.exp(-q * t) / vol_t
+    log_spots = np.log(spots)
+
+    chunk = max(1, max_cells // len(spots))
+    for start in range(0, len(coef), chunk):
+        sl = slice(start, start + chunk)
+        d1 = (log_spots[None, :] - shift[sl, None]) / vol_t[sl, None]
+        profile += coef[sl] @ np.exp(-0.5 * d1 * d1)
+
+    # gamma * S^2 * 1% = e^{-qt} n(d1) S / (vol_t) * 1%
+    return spots, profile * _INV_SQRT_2PI * spots * 0.01
+
+
+def zero_crossing(x, y, near):
+    """Linearly interpolated zero of y(x) closest to `near`, or None.
+
+    A profile that is zero everywhere (e.g. no open interest) has no zero.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if not np.any(y):
+        return None
+    exact = x[y == 0]
+    idx = np.flatnonzero(np.sign(y[:-1]) * np.sign(y[1:]) < 0)
+    roots = x[idx] - y[idx] * (x[idx + 1] - x[idx]) / (y[idx + 1] - y[idx])
+    roots = np.concatenate([roots, exact])
+    if roots.size == 0:
+        return None
+    return float(roots[np.argmin(np.abs(roots - near))])
+
+
+def gamma_walls(chain):
+    """Strikes with the largest call and put dealer gamma exposure.
+
+    Either side is None when it has no gamma exposure at all.
+    """
+    if chain.empty:
+        return None, None
+    is_call = chain['is_call'].to_numpy(dtype=bool)
+    gex = chain['gamma_exposure'].to_numpy(dtype=float)
+    strikes, (call_gex, put_gex) = bin_by_strike(chain['strike'].to_numpy(),
+                                                 [np.where(is_call, gex, 0.0), np.where(is_call, 0.0, gex)])
+    # Put exposure is dealer short gamma, so the wall is the most negative bucket
+    call_wall = float(strikes[np.argmax(call_gex)]) if np.any(call_gex) else None
+    put_wall = float(strikes[np.argmin(put_gex)]) if np.any(put_gex) else None
+    return call_wall, put_wall
+
+
+def key_levels(chain, spot, moves=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+    """Zero gamma, call wall and put wall for one underlying's chain."""
+    spots, profile = gamma_profile(chain, spot, moves=moves, r=r, q=q)
+    call_wall, put_wall = gamma_walls(chain)
+    return KeyLevels(zero_crossing(spots, profile, spot), call_wall, put_wall, spots, profile)
+
+
+def combined_gamma_profile(exposures, moves=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+    """Sum the gamma profiles of several underlyings moving together.
+
+    `exposures` holds (current_price, dealer_exposure frame) pairs; every
+    underlying is moved by the same relative amount. Returns (moves, profile).
+    """
+    if moves is None:
+        moves = sweep_moves()
+    profile = np.zeros(len(moves))
+    for current_price, chain in exposures:
+        profile += gamma_profile(chain, current_price, moves=moves, r=r, q=q)[1]
+    return np.asarray(moves, dtype=float), profile
@@ -0,0 +1,217 @@
+"""Cached access to yfinance data.
+
+Every Streamlit rerun used to hit Yahoo again for the same quote, expirations,
+chains and history. Calls now go through a two-tier cache: a bounded in-memory
+LRU shared by the whole process and a pickle-on-disk tier that survives
+restarts. Each data type gets its own time to live.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytz
+
+from .metrics import metrics
+from .providers import provider_from_env
+
+# Time to live per data type, in seconds
+QUOTE_TTL = 15
+EXPIRATIONS_TTL = 30 * 60
+CHAIN_TTL = 5 * 60
+
+MEMORY_MAX_ENTRIES = 512
+CACHE_DIR = os.environ.get('STOCKS_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'stocks'))
+
+EASTERN = pytz.timezone('US/Eastern')
+
+
+def next_market_close(now=None):
+    """Epoch seconds of the next 16:00 US/Eastern close (weekends skipped)."""
+    now = now or datetime.now(EASTERN)
+    close = now.replace(hour=16, minute=0, second=0, microsecond=0)
+    if close <= now:
+        close += timedelta(days=1)
+    while close.weekday() >= 5:
+        close += timedelta(days=1)
+    return close.timestamp()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry and an optional disk tier."""
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, cache_dir=CACHE_DIR):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.pkl')
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupt or incompatible file, drop it
+            self._remove(path)
+            return None
+        if stored_key != key:
+            return None
+        if expires_at <= time.time():
+            self._remove(path)
+            return None
+        return expires_at, value
+
+    def _write_disk(self, key, expires_at, value):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump((key, expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            self._remove(tmp)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _store(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return (True, value) for a live entry, else (False, None)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+        entry = self._read_disk(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return False, None
+        self._store(key, *entry)
+        with self._lock:
+            self.hits += 1
+        return True, entry[1]
+
+    def set(self, key, value, expires_at):
+        self._store(key, expires_at, value)
+        self._write_disk(key, expires_at, value)
+
+    def get_or_fetch(self, key, fetch, ttl=None, expires_at=None):
+        """Return the cached value for key, calling fetch() on a miss."""
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = fetch()
+        if expires_at is None:
+            expires_at = time.time() + ttl
+        self.set(key, value, expires_at)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = TTLCache()
+
+# Where uncached requests go; see providers.provider_from_env
+default_provider = provider_from_env()
+
+
+class CachedTicker:
+    """Drop-in for the parts of yf.Ticker the app uses, backed by `cache`."""
+
+    def __init__(self, ticker, cache=cache, provider=None):
+        self.ticker = ticker
+        self.cache = cache
+        self.provider = provider or default_provider
+
+    def _key(self, *parts):
+        # Keep live, recorded and replayed data apart in the shared cache
+        return (self.provider.name,) + parts
+
+    def _get(self, stage, key, fetch, **expiry):
+        """Cached value for key; misses are counted and timed as `stage`."""
+        missed = []
+
+        def timed_fetch():
+            missed.append(True)
+            with metrics.stage(stage, self.ticker):
+                return fetch()
+
+        value = self.cache.get_or_fetch(key, timed_fetch, **expiry)
+        metrics.count('cache_misses' if missed else 'cache_hits')
+        return value
+
+    def history(self, period='1mo'):
+        fetch = lambda: self.provider.history(self.ticker, period)
+        key = self._key('history', self.ticker, period)
+        if period == '1d':
+            # The one day history is what the app uses as a live quote
+            return self._get('fetch_quote', key, fetch, ttl=QUOTE_TTL)
+        return self._get('fetch_history', key, fetch, expires_at=next_market_close())
+
+    @property
+    def options(self):
+        return self._get('fetch_expirations', self._key('options', self.ticker),
+                         lambda: tuple(self.provider.expirations(self.ticker)),
+                         ttl=EXPIRATIONS_TTL)
+
+    def option_chain(self, expiration):
+        return self._get('fetch_chain', self._key('option_chain', self.ticker, expiration),
+                         lambda: self.provider.option_chain(self.ticker, expiration),
+                         ttl=CHAIN_TTL)
+
+
+def prefetch_history(tickers, period, cache=cache, provider=None):
+    """Cache the `period` history of every ticker not cached yet, in one bulk request.
+
+    Later CachedTicker.history calls for those tickers are then cache hits.
+    Empty results are not cached (bulk downloads return empty frames for
+    failed tickers), so those tickers are fetched on their own later.
+    Returns the number of tickers cached.
+    """
+    stocks = [CachedTicker(ticker, cache=cache, provider=provider) for ticker in tickers]
+    missing = [stock for stock in stocks if not cache.get(stock._key('history', stock.ticker, period))[0]]
+    if not missing:
+        return 0
+    expires_at = time.time() + QUOTE_TTL if period == '1d' else next_market_close()
+    with metrics.stage('fetch_history_bulk'):
+        histories = missing[0].provider.history_many([stock.ticker for stock in missing], period)
+    cached = 0
+    for stock in missing:
+        if not histories[stock.ticker].empty:
+            cache.set(stock._key('history', stock.ticker, period), histories[stock.ticker], expires_at)
+            cached += 1
+    return cached
@@ -0,0 +1,63 @@
+"""Max pain for every expiration of a chain in one pass.
+
+For a settlement price P the option holders' payout is
+    sum_calls OI * max(P - K, 0) + sum_puts OI * max(K - P, 0)
+and max pain is the listed strike minimising it. With strikes sorted inside
+each expiration both sums are cumulative open interest sums, so every
+candidate strike of every expiration is evaluated with a few cumsums after
+one sort instead of the O(strikes^2) double loop.
+"""
+import numpy as np
+import pandas as pd
+
+from .greeks import CONTRACT_SIZE
+
+
+def _group_cumsum(values, starts, sizes):
+    """Inclusive cumulative sum restarting at every group start."""
+    total = np.cumsum(values)
+    before = np.repeat((total - values)[starts], sizes)
+    return total - before
+
+
+def _group_total(values, starts, sizes):
+    return np.repeat(np.add.reduceat(values, starts), sizes)
+
+
+def max_pain(chain):
+    """Max pain strike per expiration of a load_chain frame.
+
+    Returns a frame sorted by expiration with the max pain strike and the
+    total holder payout (in dollars) at that strike.
+    """
+    columns = ['expiration', 'max_pain', 'payout']
+    if chain.empty:
+        return pd.DataFrame(columns=columns)
+
+    exp_codes, expirations = pd.factorize(chain['expiration'], sort=True)
+    strikes, strike_codes = np.unique(chain['strike'].to_numpy(dtype=float), return_inverse=True)
+    is_call = chain['is_call'].to_numpy(dtype=bool)
+    oi = np.nan_to_num(chain['openInterest'].to_numpy(dtype=float))
+
+    # One row per (expiration, strike), sorted by expiration then strike
+    keys, inverse = np.unique(exp_codes.astype(np.int64) * len(strikes) + strike_codes, return_inverse=True)
+    call_oi = np.bincount(inverse, weights=np.where(is_call, oi, 0.0), minlength=len(keys))
+    put_oi = np.bincount(inverse, weights=np.where(is_call, 0.0, oi), minlength=len(keys))
+    group = keys // len(strikes)
+    k = strikes[keys % len(strikes)]
+
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+
+    # Calls with K <= P pay P - K; the K == P term is zero so inclusive sums are fine
+    call_pain = k * _group_cumsum(call_oi, starts, sizes) - _group_cumsum(call_oi * k, starts, sizes)
+    # Puts with K > P pay K - P
+    put_oi_above = _group_total(put_oi, starts, sizes) - _group_cumsum(put_oi, starts, sizes)
+    put_oik_above = _group_total(put_oi * k, starts, sizes) - _group_cumsum(put_oi * k, starts, sizes)
+    payout = (call_pain + put_oik_above - k * put_oi_above) * CONTRACT_SIZE
+
+    # Rows stay grouped after sorting by (group, payout), so each start is its group's minimum
+    best = np.lexsort((payout, group))[starts]
+    return pd.DataFrame({'expiration': np.asarray(expirations)[group[best]],
+                         'max_pain': k[best],
+                         'payout': payout[best]}, columns=columns)
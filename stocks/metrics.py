@@ -0,0 +1,204 @@
+"""Per-stage timing, counters and profiling.
+
+Code that does something worth measuring wraps it in `metrics.stage(name,
+ticker)`; counters such as cache hits and network calls go through
+`metrics.count(name)`. Both are attributed to the current run (one page run
+or one fragment rerun), which is carried in a context variable so worker
+threads started with `propagate` record into the run that started them.
+
+Finished runs are kept in memory for the debug panel (with p50/p95 per stage
+over the recent history) and logged as one JSON line each on the
+'stocks.metrics' logger; set STOCKS_METRICS_LOG to a path to write those
+lines to a file. A run can also be captured with cProfile.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Finished runs and per-stage durations kept for percentiles
+HISTORY_SIZE = 500
+
+# Lines of profiler output kept per profiled run
+PROFILE_LINES = 40
+
+logger = logging.getLogger('stocks.metrics')
+
+if os.environ.get('STOCKS_METRICS_LOG'):
+    _handler = logging.FileHandler(os.environ['STOCKS_METRICS_LOG'])
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_current_run = contextvars.ContextVar('metrics_run', default=None)
+
+
+class Run:
+    """Stage timings and counters of one page run or fragment rerun."""
+
+    def __init__(self, name, profile=False):
+        self.name = name
+        self.started = time.time()
+        self.seconds = None
+        self.stages = []
+        self.counters = defaultdict(int)
+        self.profile = None
+        self._profiler = cProfile.Profile() if profile else None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.seconds is not None
+
+    def add_stage(self, stage, ticker, seconds):
+        with self._lock:
+            self.stages.append((stage, ticker, seconds))
+
+    def add_count(self, name, n):
+        with self._lock:
+            self.counters[name] += n
+
+    def stage_totals(self):
+        """Seconds per stage, summed over tickers."""
+        totals = defaultdict(float)
+        for stage, _, seconds in self.stages:
+            totals[stage] += seconds
+        return dict(totals)
+
+    def ticker_totals(self):
+        """Seconds per ticker, summed over stages."""
+        totals = defaultdict(float)
+        for _, ticker, seconds in self.stages:
+            if ticker is not None:
+                totals[ticker] += seconds
+        return dict(totals)
+
+    def record(self):
+        """JSON-serializable summary, as written to the metrics log."""
+        return {
+            'event': 'run',
+            'name': self.name,
+            'started': self.started,
+            'seconds': self.seconds,
+            'stages': self.stage_totals(),
+            'tickers': self.ticker_totals(),
+            'counters': dict(self.counters),
+        }
+
+
+class Metrics:
+    """Process-wide collector of runs, stage durations and counters."""
+
+    def __init__(self, history=HISTORY_SIZE):
+        self.runs = deque(maxlen=history)
+        self.counters = defaultdict(int)
+        self._durations = defaultdict(lambda: deque(maxlen=history))
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        run = _current_run.get()
+        return run if run is not None and not run.finished else None
+
+    def begin_run(self, name, profile=False):
+        """Start a run on this thread, replacing any unfinished one."""
+        run = Run(name, profile=profile)
+        _current_run.set(run)
+        if run._profiler is not None:
+            run._profiler.enable()
+        return run
+
+    def end_run(self, run):
+        """Finish `run`, keep it for the debug panel and log it."""
+        if run.finished:
+            return run
+        if run._profiler is not None:
+            run._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(run._profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            run.profile = out.getvalue()
+            run._profiler = None
+        run.seconds = time.perf_counter() - run._start
+        with self._lock:
+            self.runs.append(run)
+            self._durations[f"run:{run.name}"].append(run.seconds)
+        if _current_run.get() is run:
+            _current_run.set(None)
+        logger.info(json.dumps(run.record()))
+        return run
+
+    @contextmanager
+    def run(self, name, profile=False):
+        """Run scope; nested inside an active run it just joins that run."""
+        if self.current is not None:
+            yield self.current
+            return
+        run = self.begin_run(name, profile=profile)
+        try:
+            yield run
+        finally:
+            self.end_run(run)
+
+    def in_run(self, name):
+        """Decorator running the function inside `run(name)`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.run(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, stage, seconds, ticker=None):
+        with self._lock:
+            self._durations[stage].append(seconds)
+        run = self.current
+        if run is not None:
+            run.add_stage(stage, ticker, seconds)
+
+    @contextmanager
+    def stage(self, stage, ticker=None):
+        """Time the enclosed block as `stage` (of `ticker`) in the current run."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, ticker)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+        run = self.current
+        if run is not None:
+            run.add_count(name, n)
+
+    def percentiles(self, quantiles=(50, 95)):
+        """{stage: {'count', 'p50', 'p95', ...}} over the recent history, in seconds."""
+        with self._lock:
+            durations = {stage: list(values) for stage, values in self._durations.items()}
+        return {stage: {'count': len(values),
+                        **{f"p{q}": float(np.percentile(values, q)) for q in quantiles}}
+                for stage, values in sorted(durations.items()) if values}
+
+
+def propagate(func):
+    """Wrap func so each call runs in a copy of the caller's context (and run).
+
+    A fresh copy per call lets the wrapper be used on several threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+metrics = Metrics()
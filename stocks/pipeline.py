@@ -0,0 +1,214 @@
+"""Concurrent fetch and compute pipeline for the selected tickers.
+
+Each ticker's quote, expirations, chain, price history and strike exposure
+are loaded on a bounded thread pool and yielded as soon as they are ready,
+so the page is no longer the sum of every ticker's round-trips. Streamlit
+calls stay on the script thread; workers only fetch and compute.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from .aggregate import aggregate_history
+from .greeks import (load_chain, dealer_exposure, exposure_by_strike, changed_contracts,
+                    patch_exposure, patch_by_strike, time_to_expiry)
+from .implied_vol import chain_implied_vol
+from .key_levels import key_levels
+from .max_pain import max_pain
+from .market_data import CachedTicker, TTLCache
+from .metrics import metrics, propagate
+from .snapshot_store import store
+from .vol_surface import surfaces
+
+MAX_WORKERS = 8
+# Per-ticker pool for fetching many expirations at once
+CHAIN_WORKERS = 4
+
+TickerData = namedtuple('TickerData', ['ticker', 'current_price', 'expirations', 'expiration',
+                                       'price_data', 'chain', 'by_strike', 'levels', 'max_pain', 'surface'])
+
+TickerExposure = namedtuple('TickerExposure', ['ticker', 'current_price', 'chain'])
+
+# Binned snapshot histories, in memory only; keys change whenever a snapshot is written
+HISTORY_TTL = 6 * 60 * 60
+history_cache = TTLCache(max_entries=64, cache_dir=None)
+
+
+# Last solved IVs (and expirations) per ticker, by contractSymbol, to warm start the next refresh
+_last_iv = {}
+
+
+class NoDataError(Exception):
+    """Raised when Yahoo returns nothing for a ticker."""
+
+
+def with_solved_iv(ticker, chain, current_price):
+    """Replace Yahoo's IVs with ones solved from mid prices, warm started."""
+    previous = _last_iv.get(ticker)
+    if previous is not None:
+        # Contracts past expiry are never quoted again
+        today = pd.Timestamp.now(tz='US/Eastern').strftime('%Y-%m-%d')
+        previous = previous[previous['expiration'] >= today]
+    iv = chain_implied_vol(chain, current_price, previous=None if previous is None else previous['iv'])
+    solved = pd.DataFrame({'iv': iv.to_numpy(), 'expiration': chain['expiration'].to_numpy()},
+                          index=chain['contractSymbol'].to_numpy()).dropna(subset=['iv'])
+    solved = solved[~solved.index.duplicated()]
+    _last_iv[ticker] = solved if previous is None else solved.combine_first(previous)
+    return chain.assign(impliedVolatility=iv)
+
+
+def refresh_exposure(ticker, chain, current_price, previous=None, previous_price=None):
+    """Dealer exposure for a raw chain, reusing unchanged contracts of `previous`.
+
+    Greeks depend on spot, so contracts are only reused while the quote is
+    exactly unchanged (after the close, or in replay); while the underlying
+    trades every contract is recomputed on each refresh. Returns (exposure,
+    dirty) where dirty holds the strikes to re-bin, or None after a full
+    recompute. `t` is refreshed on every row, so the spot sweeps and the
+    scenario grid always decay from now.
+    """
+    if previous is None or previous_price != current_price:
+        return dealer_exposure(with_solved_iv(ticker, chain, current_price), current_price), None
+    changed, dirty = changed_contracts(previous, chain)
+    if changed.any() or len(dirty):
+        fresh = dealer_exposure(with_solved_iv(ticker, chain[changed], current_price), current_price)
+        previous = patch_exposure(previous, chain, changed, fresh)
+    return previous.assign(t=time_to_expiry(previous['expiration'].to_numpy())), dirty
+
+
+def load_ticker(ticker, expiration=None, period='1mo', all_expirations=False, previous=None,
+                ticker_factory=CachedTicker):
+    """Fetch everything one ticker panel needs and compute its exposure.
+
+    `expiration` falls back to the nearest listed date when it is missing or
+    no longer listed. With `all_expirations` every listed chain is loaded so
+    max pain covers the whole term structure and the IV surface is fitted;
+    greeks still use `expiration`.
+    Passing the previous TickerData limits the recompute to changed strikes.
+    """
+    stock = ticker_factory(ticker)
+    hist = stock.history(period="1d")
+    if hist.empty:
+        raise NoDataError(f"No data available for {ticker}")
+    current_price = hist['Close'].iloc[-1]
+
+    expirations = tuple(stock.options)
+    if not expirations:
+        raise NoDataError(f"No listed options for {ticker}")
+    if expiration not in expirations:
+        expiration = expirations[0]
+
+    price_data = stock.history(period=period)
+    if all_expirations:
+        full_chain = load_chain(stock, expirations, max_workers=CHAIN_WORKERS)
+        chain = full_chain[full_chain['expiration'] == expiration].reset_index(drop=True)
+    else:
+        full_chain = chain = load_chain(stock, expiration)
+    if chain.empty:
+        # Yahoo sometimes lists an expiration but returns no quotes for it
+        raise NoDataError(f"No option quotes for {ticker} {expiration}")
+
+    if previous is not None and previous.expiration != expiration:
+        previous = None
+    with metrics.stage('greeks', ticker):
+        chain, dirty = refresh_exposure(ticker, chain, current_price,
+                                        previous=previous and previous.chain,
+                                        previous_price=previous and previous.current_price)
+    if dirty is not None and not len(dirty):
+        # Nothing requoted: the per-strike totals still hold, only t has moved on
+        by_strike = previous.by_strike
+    else:
+        with metrics.stage('binning', ticker):
+            by_strike = exposure_by_strike(chain) if dirty is None else patch_by_strike(previous.by_strike, chain, dirty)
+    with metrics.stage('key_levels', ticker):
+        levels = key_levels(chain, current_price)
+    with metrics.stage('max_pain', ticker):
+        pain = max_pain(full_chain)
+    surface = None
+    if all_expirations:
+        with metrics.stage('vol_surface', ticker):
+            surface = surfaces.update(ticker, full_chain, current_price)
+    return TickerData(ticker, current_price, expirations, expiration, price_data, chain,
+                      by_strike, levels, pain, surface)
+
+
+def iter_tickers(jobs, loader=load_ticker, max_workers=MAX_WORKERS):
+    """Run `loader(ticker, **kwargs)` for each (ticker, kwargs) job in parallel.
+
+    Yields (ticker, result, error) in completion order; an exception in one
+    ticker is returned as its error and never affects the others. With
+    max_workers <= 1 the jobs run in order on the calling thread, where a
+    profiler attached to it can see them.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    if max_workers <= 1:
+        for ticker, kwargs in jobs:
+            try:
+                result = loader(ticker, **kwargs)
+            except Exception as e:
+                yield ticker, None, e
+            else:
+                yield ticker, result, None
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        futures = {pool.submit(propagate(loader), ticker, **kwargs): ticker for ticker, kwargs in jobs}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                yield ticker, future.result(), None
+            except Exception as e:
+                yield ticker, None, e
+
+
+def load_ticker_exposure(ticker, max_expirations=None, previous=None, ticker_factory=CachedTicker,
+                         max_workers=CHAIN_WORKERS):
+    """Load the dealer exposure of every listed expiration for one ticker.
+
+    `max_expirations` keeps only the nearest dates when set. Passing the
+    previous TickerExposure reuses the contracts that did not change.
+    """
+    stock = ticker_factory(ticker)
+    hist = stock.history(period="1d")
+    if hist.empty:
+        raise NoDataError(f"No data available for {ticker}")
+    current_price = hist['Close'].iloc[-1]
+
+    expirations = tuple(stock.options)[:max_expirations]
+    if not expirations:
+        raise NoDataError(f"No listed options for {ticker}")
+    chain = load_chain(stock, expirations, max_workers=max_workers)
+    with metrics.stage('greeks', ticker):
+        chain, _ = refresh_exposure(ticker, chain, current_price,
+                                    previous=previous and previous.chain,
+                                    previous_price=previous and previous.current_price)
+    record_snapshot(ticker, chain, current_price)
+    return TickerExposure(ticker, current_price, chain)
+
+
+def record_snapshot(ticker, chain, current_price, store=store):
+    """Queue the full chain and its per-strike exposure for the snapshot store."""
+    store.append('chain', ticker, chain)
+    store.append('exposure', ticker, exposure_by_strike(chain).reset_index().assign(spot=current_price))
+
+
+def exposure_history(ticker, column, start, freq, store=store, cache=history_cache):
+    """Time x moneyness history of one ticker's stored exposure since `start`.
+
+    `column` is 'gamma_exposure' or 'open_interest'. Only the last snapshot
+    of each `freq` bucket is opened, and the binned history is cached until
+    the oldest or newest of those snapshots changes.
+    """
+    paths = store.files('exposure', ticker, start=start, freq=freq)
+    if not paths:
+        return aggregate_history(pd.DataFrame(), column, freq)
+
+    def build():
+        snapshots = pd.concat([store.read_file(path, ['strike', 'spot', 'gamma_exposure', 'call_oi', 'put_oi'])
+                               for path in paths], ignore_index=True)
+        snapshots['open_interest'] = snapshots['call_oi'] + snapshots['put_oi']
+        return aggregate_history(snapshots.assign(ticker=ticker), column, freq)
+
+    return cache.get_or_fetch((ticker, column, freq, paths[0], paths[-1]), build, ttl=HISTORY_TTL)
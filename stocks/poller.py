@@ -0,0 +1,218 @@
+"""Process-wide market data poller shared by every session.
+
+With one Streamlit server per desk, every session used to fetch the same
+SPY/QQQ/SPX data for itself. Sessions now read through PolledTicker, which
+subscribes each cache key it reads to one shared Poller:
+
+- a key missing from the cache is fetched once, however many sessions ask
+  for it at the same moment; the others wait for that fetch;
+- a background thread refetches every subscribed key shortly before its
+  cache entry expires, so sessions keep reading fresh data from the cache;
+- keys no session has read for SUBSCRIPTION_LEASE seconds are dropped.
+
+Background refreshes run at scheduler.BACKGROUND priority, behind anything a
+session is waiting for, and due price histories are refreshed with one bulk
+request per period.
+
+Network load therefore scales with the distinct tickers being watched
+rather than with the number of users.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .market_data import CachedTicker, cache, next_market_close
+from .metrics import metrics
+from .scheduler import fetch_priority, BACKGROUND
+
+# Seconds a subscription lives after its last read (sessions have no end hook)
+SUBSCRIPTION_LEASE = 120
+
+# Refresh an entry once this fraction of its time to live has passed
+REFRESH_AT = 0.8
+
+# Seconds before retrying a key whose background refresh failed
+RETRY_DELAY = 5
+
+# Seconds between scans of the subscriptions, and concurrent refreshes
+POLL_INTERVAL = 1.0
+POLL_WORKERS = 4
+
+
+class _Subscription:
+    __slots__ = ('ticker', 'provider', 'fetch', 'ttl', 'last_read', 'refresh_at')
+
+    def __init__(self, ticker, provider, fetch, ttl):
+        self.ticker = ticker
+        self.provider = provider
+        self.fetch = fetch
+        self.ttl = ttl
+        self.last_read = time.time()
+        self.refresh_at = None
+
+
+class Poller:
+    """Owns the fetch schedule of every cache key any session is reading."""
+
+    def __init__(self, cache=cache, lease=SUBSCRIPTION_LEASE, interval=POLL_INTERVAL, workers=POLL_WORKERS):
+        self.cache = cache
+        self.lease = lease
+        self.interval = interval
+        self.workers = workers
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error = None
+        self._subscriptions = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = None
+
+    def _lifetime(self, subscription, now):
+        # Keys without a ttl (price history) live until the next close
+        return subscription.ttl if subscription.ttl is not None else next_market_close() - now
+
+    def get(self, key, fetch, ticker=None, provider=None, ttl=None, expires_at=None):
+        """Cached value for key, subscribing key for background refreshes.
+
+        `fetch` is what the poller calls to refresh the key. `ttl` sets its
+        lifetime in seconds; without one (`expires_at` given) the value lives
+        until the next market close. History keys of one `provider` are
+        refreshed together in bulk.
+        """
+        now = time.time()
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None:
+                subscription = self._subscriptions[key] = _Subscription(ticker, provider, fetch, ttl)
+            subscription.last_read = now
+            self._start()
+
+        hit, value = self.cache.get(key)
+        if hit:
+            metrics.count('cache_hits')
+            if subscription.refresh_at is None:
+                # Cached before anyone subscribed (e.g. the disk tier): refresh on schedule from now
+                subscription.refresh_at = now + REFRESH_AT * self._lifetime(subscription, now)
+            return value
+        metrics.count('cache_misses')
+        return self._fetch(key, subscription)
+
+    def _fetch(self, key, subscription):
+        """Fetch key once for all concurrent callers and store it in the cache."""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            metrics.count('coalesced_fetches')
+            return future.result()
+
+        try:
+            started = time.time()
+            value = subscription.fetch()
+            lifetime = self._lifetime(subscription, started)
+            self.cache.set(key, value, started + lifetime)
+            subscription.refresh_at = started + REFRESH_AT * lifetime
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            subscription.refresh_at = time.time() + RETRY_DELAY
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _refresh(self, key, subscription):
+        try:
+            with fetch_priority(BACKGROUND):
+                self._fetch(key, subscription)
+            self.refreshes += 1
+            metrics.count('poller_refreshes')
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+
+    def _refresh_histories(self, provider, period, due):
+        """Refresh the (key, subscription) history entries of one period in one request."""
+        try:
+            with fetch_priority(BACKGROUND):
+                histories = provider.history_many([subscription.ticker for _, subscription in due], period)
+        except Exception as e:
+            for _, subscription in due:
+                subscription.refresh_at = time.time() + RETRY_DELAY
+            self.errors += 1
+            self.last_error = e
+            return
+        now = time.time()
+        refreshed = 0
+        for key, subscription in due:
+            if histories[subscription.ticker].empty:
+                # Failed inside the bulk download: keep the cached value and retry alone
+                self._pool.submit(self._refresh, key, subscription)
+                continue
+            lifetime = self._lifetime(subscription, now)
+            self.cache.set(key, histories[subscription.ticker], now + lifetime)
+            subscription.refresh_at = now + REFRESH_AT * lifetime
+            refreshed += 1
+        self.refreshes += refreshed
+        metrics.count('poller_refreshes', refreshed)
+
+    def _start(self):
+        # Called with the lock held
+        if self._thread is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='poller-fetch')
+            self._thread = threading.Thread(target=self._run, name='market-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            due = []
+            with self._lock:
+                for key, subscription in list(self._subscriptions.items()):
+                    if now - subscription.last_read > self.lease:
+                        del self._subscriptions[key]
+                    elif (subscription.refresh_at is not None and subscription.refresh_at <= now
+                          and key not in self._inflight):
+                        # Not due again until this refresh sets the next time
+                        subscription.refresh_at = float('inf')
+                        due.append((key, subscription))
+            histories = {}
+            for key, subscription in due:
+                # Keys are (provider name, kind, ticker, ...), see CachedTicker
+                if key[1] == 'history' and subscription.provider is not None:
+                    histories.setdefault((id(subscription.provider), key[3]), []).append((key, subscription))
+                else:
+                    self._pool.submit(self._refresh, key, subscription)
+            for batch in histories.values():
+                self._pool.submit(self._refresh_histories, batch[0][1].provider, batch[0][0][3], batch)
+
+    def tickers(self):
+        """Distinct tickers with at least one live subscription."""
+        with self._lock:
+            return sorted({s.ticker for s in self._subscriptions.values() if s.ticker is not None})
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+poller = Poller()
+
+
+class PolledTicker(CachedTicker):
+    """CachedTicker whose reads go through the shared poller."""
+
+    def __init__(self, ticker, poller=poller, provider=None):
+        super().__init__(ticker, cache=poller.cache, provider=provider)
+        self.poller = poller
+
+    def _get(self, stage, key, fetch, **expiry):
+        def timed_fetch():
+            with metrics.stage(stage, self.ticker):
+                return fetch()
+
+        return self.poller.get(key, timed_fetch, ticker=self.ticker, provider=self.provider, **expiry)
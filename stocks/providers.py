@@ -0,0 +1,186 @@
+"""Market data providers.
+
+A provider answers the four questions the app asks of Yahoo: a quote, price
+history, listed expirations and one expiration's option chain. The live
+provider calls yfinance; the recording provider wraps another provider and
+saves every response as a Parquet snapshot; the replay provider serves those
+snapshots back with simulated network latency so the app, the compute path
+and the cache/concurrency strategies can be exercised offline.
+
+Select one with STOCKS_DATA_MODE=live|record|replay, STOCKS_SNAPSHOT_DIR and
+STOCKS_REPLAY_LATENCY (seconds per call). Requests that reach Yahoo go
+through scheduler.ScheduledProvider's global rate limit. yfinance is only imported when
+the live provider makes its first request.
+"""
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from .metrics import metrics
+
+OptionChain = namedtuple('OptionChain', ['calls', 'puts'])
+
+SNAPSHOT_DIR = os.environ.get('STOCKS_SNAPSHOT_DIR', 'snapshots')
+
+
+class MarketDataProvider:
+    """Interface for market data sources."""
+
+    name = 'base'
+
+    def quote(self, ticker):
+        """Latest price; by default the last close of the one day history."""
+        hist = self.history(ticker, '1d')
+        return None if hist.empty else float(hist['Close'].iloc[-1])
+
+    def history(self, ticker, period):
+        raise NotImplementedError
+
+    def history_many(self, tickers, period):
+        """{ticker: history} for several tickers; one request where the source allows."""
+        return {ticker: self.history(ticker, period) for ticker in tickers}
+
+    def expirations(self, ticker):
+        raise NotImplementedError
+
+    def option_chain(self, ticker, expiration):
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data straight from Yahoo via yfinance."""
+
+    name = 'yfinance'
+
+    @staticmethod
+    def _ticker(ticker):
+        import yfinance as yf
+
+        metrics.count('network_calls')
+        return yf.Ticker(ticker)
+
+    def history(self, ticker, period):
+        return self._ticker(ticker).history(period=period)
+
+    def history_many(self, tickers, period):
+        import yfinance as yf
+
+        tickers = list(tickers)
+        metrics.count('network_calls')
+        data = yf.download(tickers, period=period, group_by='ticker', actions=True, ignore_tz=False,
+                           progress=False, threads=False)
+        # Columns are (ticker, field); a ticker Yahoo knows nothing about comes back all NaN
+        return {ticker: (data[ticker].dropna(how='all') if data is not None and ticker in data.columns.levels[0]
+                         else pd.DataFrame())
+                for ticker in tickers}
+
+    def expirations(self, ticker):
+        return tuple(self._ticker(ticker).options)
+
+    def option_chain(self, ticker, expiration):
+        chain = self._ticker(ticker).option_chain(expiration)
+        return OptionChain(chain.calls, chain.puts)
+
+
+def _snapshot_path(root, ticker, *parts):
+    return os.path.join(root, ticker, '_'.join(parts) + '.parquet')
+
+
+class RecordingProvider(MarketDataProvider):
+    """Pass calls through to another provider and save each response."""
+
+    def __init__(self, provider, root=SNAPSHOT_DIR):
+        self.provider = provider
+        self.root = root
+        self.name = f'record:{provider.name}'
+
+    def _save(self, frame, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        frame.to_parquet(tmp)
+        os.replace(tmp, path)
+
+    def history(self, ticker, period):
+        hist = self.provider.history(ticker, period)
+        self._save(hist, _snapshot_path(self.root, ticker, 'history', period))
+        return hist
+
+    def history_many(self, tickers, period):
+        histories = self.provider.history_many(tickers, period)
+        for ticker, hist in histories.items():
+            self._save(hist, _snapshot_path(self.root, ticker, 'history', period))
+        return histories
+
+    def expirations(self, ticker):
+        expirations = self.provider.expirations(ticker)
+        self._save(pd.DataFrame({'expiration': list(expirations)}),
+                   _snapshot_path(self.root, ticker, 'expirations'))
+        return expirations
+
+    def option_chain(self, ticker, expiration):
+        chain = self.provider.option_chain(ticker, expiration)
+        frame = pd.concat([chain.calls.assign(_side='C'), chain.puts.assign(_side='P')], ignore_index=True)
+        self._save(frame, _snapshot_path(self.root, ticker, 'chain', expiration))
+        return chain
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serve recorded snapshots with a simulated per-call latency.
+
+    Each call sleeps `latency` seconds, varied uniformly by +/- `jitter` of
+    itself, before reading its snapshot. Missing snapshots raise
+    FileNotFoundError just as a failed request would raise upstream.
+    """
+
+    name = 'replay'
+
+    def __init__(self, root=SNAPSHOT_DIR, latency=0.0, jitter=0.0):
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+
+    def _wait(self):
+        # Counted like a live request so replays exercise the same metrics
+        metrics.count('network_calls')
+        if self.latency > 0:
+            time.sleep(self.latency * (1.0 + random.uniform(-self.jitter, self.jitter)))
+
+    def history(self, ticker, period):
+        self._wait()
+        return pd.read_parquet(_snapshot_path(self.root, ticker, 'history', period))
+
+    def expirations(self, ticker):
+        self._wait()
+        frame = pd.read_parquet(_snapshot_path(self.root, ticker, 'expirations'))
+        return tuple(frame['expiration'])
+
+    def option_chain(self, ticker, expiration):
+        self._wait()
+        frame = pd.read_parquet(_snapshot_path(self.root, ticker, 'chain', expiration))
+        side = frame.pop('_side')
+        return OptionChain(frame[side == 'C'].reset_index(drop=True),
+                           frame[side == 'P'].reset_index(drop=True))
+
+
+def provider_from_env(environ=os.environ):
+    """Build the provider selected by the STOCKS_* environment variables.
+
+    Live requests are always rate limited; replays only when
+    STOCKS_RATE_LIMIT is set, to rehearse the limiter offline.
+    """
+    from .scheduler import ScheduledProvider
+
+    mode = environ.get('STOCKS_DATA_MODE', 'live')
+    root = environ.get('STOCKS_SNAPSHOT_DIR', SNAPSHOT_DIR)
+    if mode == 'live':
+        return ScheduledProvider(YFinanceProvider())
+    if mode == 'record':
+        return RecordingProvider(ScheduledProvider(YFinanceProvider()), root=root)
+    if mode == 'replay':
+        replay = ReplayProvider(root=root, latency=float(environ.get('STOCKS_REPLAY_LATENCY', 0)))
+        return ScheduledProvider(replay) if 'STOCKS_RATE_LIMIT' in environ else replay
+    raise ValueError(f"Unknown STOCKS_DATA_MODE: {mode}")
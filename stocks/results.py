@@ -0,0 +1,45 @@
+"""Streaming row output for the headless tools (scan.py, backtest.py).
+
+pyarrow is imported on the first Parquet write.
+"""
+import pandas as pd
+
+
+class ResultWriter:
+    """Append result rows to a Parquet (one row group per batch) or CSV file.
+
+    Use it as a context manager so the Parquet footer is written even when
+    the run fails part way.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._wrote_csv_header = False
+
+    def write(self, rows):
+        frame = pd.DataFrame(rows)
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.path, mode='a' if self._wrote_csv_header else 'w',
+                         header=not self._wrote_csv_header, index=False)
+            self._wrote_csv_header = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,115 @@
+"""Dealer exposure revalued across a grid of spot and volatility scenarios.
+
+Every contract is repriced at every (spot, IV shock) pair of the grid, after
+an optional number of days of time decay, in one broadcasted computation.
+As in key_levels.gamma_profile, everything that depends on the contract
+alone is precomputed, each cell only evaluates d1, N(d1) and n(d1), and the
+sums over contracts are batched matrix products: delta, gamma, vanna and
+charm are all linear in N(d1), n(d1) and n(d1) * d1 with per contract and
+shock weights. Contracts are processed in chunks so no intermediate array
+exceeds MAX_CELLS entries, whatever the chain size.
+
+Exposures use the units of dealer_exposure, evaluated at each scenario's
+spot: delta per contract notional, gamma per 1% move, vanna per vol point
+and charm per calendar day.
+"""
+from collections import namedtuple
+
+import numpy as np
+from scipy.special import ndtr
+
+from .greeks import CONTRACT_SIZE, RISK_FREE_RATE, DIVIDEND_YIELD, MIN_VOL, MIN_TIME
+from .key_levels import sweep_moves
+
+# Default grid: spot +/- 10% in 200 steps, IV shifted -10 to +20 vol points in 50 steps
+SPOT_RANGE = 0.10
+SPOT_POINTS = 200
+VOL_SHOCK_LOW = -0.10
+VOL_SHOCK_HIGH = 0.20
+VOL_POINTS = 50
+
+# Bound on contracts x spots x shocks cells evaluated at once
+MAX_CELLS = 4_000_000
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+Scenarios = namedtuple('Scenarios', ['spots', 'vol_shocks', 'days', 'delta_exposure', 'gamma_exposure',
+                                     'vanna_exposure', 'charm_exposure'])
+
+
+def vol_shocks(low=VOL_SHOCK_LOW, high=VOL_SHOCK_HIGH, points=VOL_POINTS):
+    """Additive IV shocks (0.05 = +5 vol points)."""
+    return np.linspace(low, high, points)
+
+
+def scenario_grid(chain, spot, moves=None, shocks=None, days=0.0, r=RISK_FREE_RATE, q=DIVIDEND_YIELD,
+                  max_cells=MAX_CELLS):
+    """Total dealer exposure at spot * moves and IV + shocks, `days` from now.
+
+    `chain` is a dealer_exposure frame; contracts that expire within `days`
+    drop out. Each exposure array is shaped (len(moves), len(shocks)), and is
+    all NaN when no contract is left to revalue.
+    """
+    moves = sweep_moves(SPOT_RANGE, SPOT_POINTS) if moves is None else np.asarray(moves, dtype=float)
+    shocks = vol_shocks() if shocks is None else np.asarray(shocks, dtype=float)
+    spots = spot * moves
+    n_spots, n_shocks = len(spots), len(shocks)
+
+    is_call = chain['is_call'].to_numpy(dtype=bool)
+    position = np.where(is_call, 1.0, -1.0) * chain['openInterest'].to_numpy(dtype=float) * CONTRACT_SIZE
+    iv = chain['impliedVolatility'].to_numpy(dtype=float)
+    t = chain['t'].to_numpy(dtype=float) - days / 365.0
+    strike = chain['strike'].to_numpy(dtype=float)
+    keep = (position != 0) & np.isfinite(iv) & (iv > 0) & (t > 0) & (strike > 0)
+    if not keep.any():
+        # Nothing outstanding is not the same as flat exposure, so don't report zeros
+        return Scenarios(spots, shocks, days, *(np.full((n_spots, n_shocks), np.nan) for _ in range(4)))
+    t = np.maximum(t[keep], MIN_TIME)
+    iv, strike, is_call = iv[keep], strike[keep], is_call[keep]
+    weight = position[keep] * np.exp(-q * t)
+    sqrt_t = np.sqrt(t)
+    # log(S/K) + (r - q) t per spot and contract; 0.5 sigma^2 t is added per shock
+    drift = (r - q) * t - np.log(strike)
+    log_spots = np.log(spots)
+
+    # Sums over contracts per (shock, spot) of N(d1) w, n(d1) [w_gamma, w_vanna, w_charm]
+    # and n(d1) d1 [w_vanna, w_charm]
+    cdf_sum = np.zeros((n_shocks, n_spots))
+    pdf_sum = np.zeros((n_shocks, n_spots, 3))
+    pdf_d1_sum = np.zeros((n_shocks, n_spots, 2))
+
+    chunk = max(1, max_cells // max(1, n_spots * n_shocks))
+    for start in range(0, len(weight), chunk):
+        sl = slice(start, start + chunk)
+        sigma = np.maximum(iv[None, sl] + shocks[:, None], MIN_VOL)
+        vol_t = sigma * sqrt_t[sl]
+        inv_vol_t = 1.0 / vol_t
+        d1 = ((log_spots[None, :, None] + drift[None, None, sl] + 0.5 * (sigma * sigma * t[sl])[:, None, :])
+              * inv_vol_t[:, None, :])
+        pdf = np.exp(-0.5 * d1 * d1)
+
+        w = np.broadcast_to(weight[sl], sigma.shape)
+        # gamma = w n(d1) / (S vol_t)
+        # vanna = -w n(d1) d2 / sigma = w n(d1) sqrt(t) - w n(d1) d1 / sigma
+        # charm = q delta - w n(d1) ((r - q) / vol_t - d2 / 2t)
+        #       = q delta - w n(d1) ((r - q) / vol_t + sigma / 2 sqrt(t)) + w n(d1) d1 / 2t
+        pdf_weights = np.stack([w * inv_vol_t, w * sqrt_t[sl],
+                                -w * ((r - q) * inv_vol_t + 0.5 * sigma / sqrt_t[sl])], axis=-1)
+        pdf_d1_weights = np.stack([-w / sigma, w / (2.0 * t[sl])], axis=-1)
+        cdf_sum += np.matmul(ndtr(d1), w[..., None])[..., 0]
+        pdf_sum += np.matmul(pdf, pdf_weights)
+        pdf_d1_sum += np.matmul(pdf * d1, pdf_d1_weights)
+        del d1, pdf
+
+    # Put delta is N(d1) - 1: subtract the put weights once instead of per cell
+    delta = (cdf_sum - weight[~is_call].sum()).T
+    gamma = pdf_sum[..., 0].T * _INV_SQRT_2PI / spots[:, None]
+    vanna = (pdf_sum[..., 1] + pdf_d1_sum[..., 0]).T * _INV_SQRT_2PI
+    charm = q * delta + (pdf_sum[..., 2] + pdf_d1_sum[..., 1]).T * _INV_SQRT_2PI
+
+    scale = spots[:, None]
+    return Scenarios(spots, shocks, days,
+                     delta * scale,
+                     gamma * scale * scale * 0.01,
+                     vanna * scale * 0.01,
+                     charm * scale / 365.0)
@@ -0,0 +1,151 @@
+"""Rate-limited, prioritized access to the upstream data provider.
+
+Every provider request takes a token from one process-wide TokenBucket, so
+the whole server stays inside a global request budget (STOCKS_RATE_LIMIT
+requests per second, bursts of STOCKS_RATE_BURST). When requests queue for
+tokens they are served by priority: a panel the user is interacting with
+first, then page loads, then the poller's background refreshes.
+
+Transient failures (throttling, timeouts, dropped connections) are retried
+with exponential backoff and full jitter; a throttling error also drains the
+bucket so every caller slows down, not just the one that was refused. When
+retries run out a RateLimitError explains it instead of a raw traceback.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import metrics
+from .providers import MarketDataProvider
+
+# Fetch priorities, lower first
+INTERACTIVE = 0
+FOREGROUND = 1
+BACKGROUND = 2
+
+RATE_LIMIT = float(os.environ.get('STOCKS_RATE_LIMIT', 5))
+RATE_BURST = int(os.environ.get('STOCKS_RATE_BURST', 20))
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+_priority = contextvars.ContextVar('fetch_priority', default=FOREGROUND)
+
+
+@contextmanager
+def fetch_priority(priority):
+    """Run the enclosed fetches (and threads started with metrics.propagate) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitError(Exception):
+    """Raised when upstream keeps throttling after every retry."""
+
+
+def is_transient(error):
+    """Whether a failed request is worth retrying (throttling, timeouts, connection drops)."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    name = type(error).__name__
+    return (any(part in name for part in ('RateLimit', 'Timeout', 'ConnectionError', 'TooManyRequests'))
+            or 'Too Many Requests' in str(error) or '429' in str(error))
+
+
+def is_throttled(error):
+    return 'RateLimit' in type(error).__name__ or 'Too Many Requests' in str(error) or '429' in str(error)
+
+
+class TokenBucket:
+    """Token bucket whose waiting callers are served in priority order."""
+
+    def __init__(self, rate=RATE_LIMIT, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=FOREGROUND):
+        """Block until a token is available to this caller; returns the seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._refill()
+                if self._waiting[0] == ticket:
+                    if self._tokens >= 1:
+                        heapq.heappop(self._waiting)
+                        self._tokens -= 1
+                        self._cond.notify_all()
+                        return time.monotonic() - start
+                    self._cond.wait((1 - self._tokens) / self.rate)
+                else:
+                    self._cond.wait()
+
+    def drain(self, seconds):
+        """Hold back every caller for about `seconds` (upstream asked us to slow down)."""
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class ScheduledProvider(MarketDataProvider):
+    """Wrap a provider with the token bucket, priorities and retries."""
+
+    def __init__(self, provider, bucket=None, max_retries=MAX_RETRIES):
+        self.provider = provider
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.name = provider.name
+
+    def _call(self, method, *args):
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire(_priority.get())
+            if waited > 0.01:
+                metrics.record('rate_limit_wait', waited)
+            try:
+                return getattr(self.provider, method)(*args)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                metrics.count('fetch_retries')
+                if attempt == self.max_retries:
+                    if is_throttled(e):
+                        raise RateLimitError(f"Yahoo is rate limiting requests ({e}); "
+                                             "data will refresh once the limit clears") from e
+                    raise
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                if is_throttled(e):
+                    self.bucket.drain(delay)
+                time.sleep(delay)
+
+    def history(self, ticker, period):
+        return self._call('history', ticker, period)
+
+    def history_many(self, tickers, period):
+        # One request (one token) for the whole batch
+        return self._call('history_many', tickers, period)
+
+    def expirations(self, ticker):
+        return self._call('expirations', ticker)
+
+    def option_chain(self, ticker, expiration):
+        return self._call('option_chain', ticker, expiration)
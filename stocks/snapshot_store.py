@@ -0,0 +1,190 @@
+"""Append-only intraday store of chain and exposure snapshots.
+
+Snapshots are written as one Parquet file each under
+    <root>/<kind>/<ticker>/<YYYY-MM-DD>/<HHMMSSffffff>.parquet
+(dates and times in US/Eastern). Files are never rewritten, so writers need
+no locking and readers can pick the files in a time window from their names
+alone, then open only those files, memory mapped, with just the columns they
+need. Floats are stored as float32 and repeated strings (contract symbols,
+expirations) dictionary encoded to keep a full trading day of SPX cheap.
+
+Writes go through a background thread so the page never waits on disk.
+pyarrow is imported on the first write or read.
+"""
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.environ.get('STOCKS_STORE_DIR', 'store')
+
+# Minimum seconds between two snapshots of the same kind and ticker
+MIN_INTERVAL = 60
+
+TIMEZONE = 'US/Eastern'
+_FILE_FORMAT = '%H%M%S%f'
+
+
+def _widen(frame):
+    # Widen float32 back to float64 for the compute paths
+    floats = frame.select_dtypes(np.float32).columns
+    frame[floats] = frame[floats].astype(np.float64)
+    return frame
+
+
+def compact_table(frame):
+    """Arrow table with float32 floats and dictionary encoded strings."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_floating(field.type):
+            fields.append(pa.field(field.name, pa.float32()))
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            fields.append(pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(field)
+    return table.cast(pa.schema(fields))
+
+
+class SnapshotStore:
+    """Partitioned, append-only Parquet snapshots with a background writer."""
+
+    def __init__(self, root=STORE_DIR, min_interval=MIN_INTERVAL):
+        self.root = root
+        self.min_interval = min_interval
+        self.errors = 0
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _partition(self, kind, ticker, date):
+        return os.path.join(self.root, kind, ticker, date)
+
+    def write(self, kind, ticker, frame, timestamp=None):
+        """Write one snapshot synchronously and return its path."""
+        import pyarrow.parquet as pq
+
+        timestamp = pd.Timestamp(timestamp or pd.Timestamp.now(tz=TIMEZONE)).tz_convert(TIMEZONE)
+        directory = self._partition(kind, ticker, timestamp.strftime('%Y-%m-%d'))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, timestamp.strftime(_FILE_FORMAT) + '.parquet')
+        table = compact_table(frame.assign(snapshot_time=timestamp))
+        tmp = path + '.tmp'
+        pq.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, path)
+        return path
+
+    def append(self, kind, ticker, frame, timestamp=None):
+        """Queue a snapshot for the background writer.
+
+        Returns False when the previous snapshot of this kind and ticker is
+        younger than min_interval and this one was skipped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_write.get((kind, ticker))
+            if last is not None and now - last < self.min_interval:
+                return False
+            self._last_write[(kind, ticker)] = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='snapshot-writer', daemon=True)
+                self._thread.start()
+        self._queue.put((kind, ticker, frame, timestamp or pd.Timestamp.now(tz=TIMEZONE)))
+        return True
+
+    def _run(self):
+        while True:
+            kind, ticker, frame, timestamp = self._queue.get()
+            try:
+                self.write(kind, ticker, frame, timestamp)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued snapshot is on disk."""
+        self._queue.join()
+
+    def files(self, kind, ticker, start=None, end=None, freq=None):
+        """Snapshot files in [start, end], oldest first, chosen by name only.
+
+        With `freq` (e.g. '2h') only the last file of each time bucket is
+        kept, so a long history can be read without opening every snapshot.
+        """
+        base = os.path.join(self.root, kind, ticker)
+        if not os.path.isdir(base):
+            return []
+        start = pd.Timestamp(start).tz_convert(TIMEZONE) if start is not None else None
+        end = pd.Timestamp(end).tz_convert(TIMEZONE) if end is not None else None
+        paths, stamps = [], []
+        for date in sorted(os.listdir(base)):
+            if start is not None and date < start.strftime('%Y-%m-%d'):
+                continue
+            if end is not None and date > end.strftime('%Y-%m-%d'):
+                continue
+            for name in sorted(os.listdir(os.path.join(base, date))):
+                if name.endswith('.parquet'):
+                    paths.append(os.path.join(base, date, name))
+                    stamps.append(f"{date} {name[:-8]}")
+        if not paths:
+            return []
+
+        stamps = pd.DatetimeIndex(pd.to_datetime(stamps, format='%Y-%m-%d ' + _FILE_FORMAT)).tz_localize(TIMEZONE)
+        keep = np.ones(len(paths), dtype=bool)
+        if start is not None:
+            keep &= stamps >= start
+        if end is not None:
+            keep &= stamps <= end
+        paths = [path for path, kept in zip(paths, keep) if kept]
+        if freq is not None and paths:
+            buckets = stamps[keep].floor(freq).asi8
+            last = np.r_[buckets[1:] != buckets[:-1], True]
+            paths = [path for path, kept in zip(paths, last) if kept]
+        return paths
+
+    def read_file(self, path, columns=None):
+        """One snapshot file (only `columns` plus snapshot_time), memory mapped."""
+        import pyarrow.parquet as pq
+
+        if columns is not None and 'snapshot_time' not in columns:
+            columns = list(columns) + ['snapshot_time']
+        return _widen(pq.read_table(path, columns=columns, memory_map=True).to_pandas())
+
+    def iter_read(self, kind, ticker, start=None, end=None, columns=None):
+        """Yield the snapshots of one ticker in [start, end] one frame at a time.
+
+        Unlike read, only one snapshot is in memory at once, so months of
+        chains can be streamed.
+        """
+        for path in self.files(kind, ticker, start, end):
+            yield self.read_file(path, columns)
+
+    def read(self, kind, ticker, start=None, end=None, columns=None, freq=None):
+        """Concatenate the snapshots of one ticker in [start, end].
+
+        Only the requested columns (plus snapshot_time) are read, through
+        memory mapped files; with `freq` only the last snapshot per time
+        bucket (see files).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if columns is not None and 'snapshot_time' not in columns:
+            columns = list(columns) + ['snapshot_time']
+        tables = [pq.read_table(path, columns=columns, memory_map=True)
+                  for path in self.files(kind, ticker, start, end, freq)]
+        if not tables:
+            return pd.DataFrame(columns=columns or ['snapshot_time'])
+        return _widen(pa.concat_tables(tables, promote_options='default').to_pandas())
+
+
+store = SnapshotStore()
@@ -0,0 +1,283 @@
+"""Implied volatility surface across every listed expiration.
+
+Each expiration is a slice of total implied variance w = iv^2 * t against
+log-moneyness k = log(strike / forward), fitted on its out-of-the-money
+quotes with a vega-weighted quadratic w(k) = a + b*k + c*k^2. All slices are
+fitted at once by stacking their 3x3 normal equations.
+
+Two static arbitrage checks follow. A slice whose risk-neutral density
+(Gatheral's g(k)) goes negative inside its quoted range is replaced by its
+flat ATM variance, and total variance is raised where needed so it never
+decreases with expiry at any moneyness (calendar spreads). The repaired
+surface is tabulated on a moneyness x expiry grid, so evaluating it at any
+strike and time is a bilinear lookup with no refitting.
+
+SurfaceCache keeps the latest surface per ticker and, on refresh, re-solves
+and refits only the expirations whose quotes changed.
+"""
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .greeks import RISK_FREE_RATE, DIVIDEND_YIELD, time_to_expiry
+from .implied_vol import chain_implied_vol, MIN_IV, MAX_IV
+from .metrics import metrics
+
+# Tabulated moneyness axis, log(strike / forward)
+K_RANGE = 1.0
+GRID_POINTS = 201
+
+# Fewer usable quotes than this and a slice gets a flat fit
+MIN_QUOTES = 5
+
+# Slack on the butterfly check for rounding in the density
+DENSITY_TOL = 1e-6
+
+# Refit every slice at least this often (seconds) as time to expiry decays
+REFIT_AFTER = 15 * 60
+
+# Columns whose change in a slice triggers its refit
+QUOTE_COLUMNS = ['strike', 'bid', 'ask', 'lastPrice', 'is_call']
+
+FIT_COLUMNS = ['t', 'a', 'b', 'c', 'k_low', 'k_high', 'flattened']
+
+
+def moneyness_grid():
+    return np.linspace(-K_RANGE, K_RANGE, GRID_POINTS)
+
+
+def slice_quotes(strike, is_call, iv, t, spot, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+    """Log-moneyness, total variance, vega weight and usability of each quote.
+
+    Only out-of-the-money quotes (both sides at the money) with an IV in
+    [MIN_IV, MAX_IV] and |k| <= K_RANGE are usable.
+    """
+    k = np.log(strike / (spot * np.exp((r - q) * t)))
+    w = iv * iv * t
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sqrt_w = np.sqrt(w)
+        d1 = -k / sqrt_w + 0.5 * sqrt_w
+        usable = (np.where(is_call, k >= 0, k <= 0) & np.isfinite(iv) & (iv >= MIN_IV) & (iv <= MAX_IV)
+                  & (np.abs(k) <= K_RANGE))
+    # Vega is proportional to the normal density of d1 in total variance terms
+    weight = np.where(usable, np.exp(-0.5 * d1 * d1), 0.0)
+    return k, w, weight, usable
+
+
+def butterfly_violations(params, k_low, k_high, grid=None):
+    """Slices whose risk-neutral density goes negative inside their quoted range."""
+    grid = moneyness_grid() if grid is None else grid
+    k = np.clip(grid[None, :], k_low[:, None], k_high[:, None])
+    a, b, c = (params[:, i, None] for i in range(3))
+    w = a + b * k + c * k * k
+    dw = b + 2 * c * k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        g = (1 - k * dw / (2 * w)) ** 2 - 0.25 * dw * dw * (1 / w + 0.25) + c
+    return ~(g >= -DENSITY_TOL).all(axis=1)
+
+
+def fit_slices(k, w, weight, codes, n_slices):
+    """Vega-weighted least squares w(k) = a + b*k + c*k^2 for every slice at once.
+
+    Returns (params, k_low, k_high, flattened): an (n_slices, 3) array of
+    (a, b, c), each slice's quoted moneyness range, and which slices were
+    given a flat fit because they had fewer than MIN_QUOTES quotes, a concave
+    or non-positive fit, or a negative density. Slices without any quote have
+    NaN parameters.
+    """
+    sums = lambda values: np.bincount(codes, weights=values, minlength=n_slices)
+    moments = [sums(weight * k ** p) for p in range(5)]
+    rhs = np.stack([sums(weight * w * k ** p) for p in range(3)], axis=1)
+    normal = np.stack([np.stack([moments[i + j] for j in range(3)], axis=1) for i in range(3)], axis=1)
+    counts = np.bincount(codes, minlength=n_slices)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        flat = rhs[:, 0] / moments[0]
+    params = np.zeros((n_slices, 3))
+    params[:, 0] = flat
+    smile = (counts >= MIN_QUOTES) & (moments[0] > 0)
+    if smile.any():
+        # A tiny ridge keeps slices quoted at only one or two strikes solvable
+        ridge = 1e-10 * moments[0][smile, None, None] * np.eye(3)
+        params[smile] = np.linalg.solve(normal[smile] + ridge, rhs[smile][..., None])[..., 0]
+
+    k_low = np.full(n_slices, np.inf)
+    k_high = np.full(n_slices, -np.inf)
+    np.minimum.at(k_low, codes, k)
+    np.maximum.at(k_high, codes, k)
+    k_low, k_high = np.minimum(k_low, 0.0), np.maximum(k_high, 0.0)
+
+    a, b, c = params.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vertex = np.clip(np.where(c > 0, -b / (2 * c), 0.0), k_low, k_high)
+    lowest = np.min([a + b * x + c * x * x for x in (k_low, k_high, vertex)], axis=0)
+    flattened = ~smile | (c < 0) | ~(lowest > 0)
+    flattened |= butterfly_violations(params, k_low, k_high)
+    params[flattened] = np.c_[flat, np.zeros((n_slices, 2))][flattened]
+    return params, k_low, k_high, flattened
+
+
+def fit_chain(chain, spot, now=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+    """Solve IVs and fit one slice per expiration of a load_chain frame.
+
+    Returns a frame of FIT_COLUMNS indexed by expiration, without the
+    expirations that had no usable quote.
+    """
+    codes, expirations = pd.factorize(chain['expiration'].to_numpy())
+    t_all = time_to_expiry(chain['expiration'].to_numpy(), now=now)
+    t = np.zeros(len(expirations))
+    t[codes] = t_all
+    iv = chain_implied_vol(chain, spot, now=now, r=r, q=q).to_numpy()
+    k, w, weight, usable = slice_quotes(chain['strike'].to_numpy(dtype=float),
+                                        chain['is_call'].to_numpy(dtype=bool), iv, t_all, spot, r=r, q=q)
+    params, k_low, k_high, flattened = fit_slices(k[usable], w[usable], weight[usable], codes[usable],
+                                                  len(expirations))
+    fits = pd.DataFrame({'t': t, 'a': params[:, 0], 'b': params[:, 1], 'c': params[:, 2],
+                         'k_low': k_low, 'k_high': k_high, 'flattened': flattened},
+                        index=pd.Index(expirations, name='expiration'))
+    return fits[np.isfinite(fits['a']) & (fits['a'] > 0)]
+
+
+def slice_variance(fits, k):
+    """Total variance of each fitted slice (rows) at log-moneyness k.
+
+    Inside its quoted range a slice is its quadratic; beyond, the wings go
+    on linearly with the edge slope, kept outward and within Lee's bound of 2.
+    """
+    a, b, c, k_low, k_high = (fits[name].to_numpy(dtype=float)[:, None]
+                              for name in ['a', 'b', 'c', 'k_low', 'k_high'])
+    quadratic = lambda x: a + b * x + c * x * x
+    inside = np.clip(k, k_low, k_high)
+    left = np.clip(b + 2 * c * k_low, -2.0, 0.0)
+    right = np.clip(b + 2 * c * k_high, 0.0, 2.0)
+    return (quadratic(inside) + left * np.minimum(k - k_low, 0.0)
+            + right * np.maximum(k - k_high, 0.0))
+
+
+class VolSurface:
+    """Fitted slices tabulated on a moneyness x expiry grid.
+
+    `variance[i, j]` is the total variance of expiration i (sorted by time)
+    at moneyness grid[j], after the calendar repair. `butterfly` holds the
+    expirations flattened by the slice checks and `calendar` the number of
+    grid cells raised by the calendar check.
+    """
+
+    def __init__(self, spot, fits, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+        fits = fits.sort_values('t')
+        self.spot = spot
+        self.r = r
+        self.q = q
+        self.fits = fits
+        self.expirations = fits.index.to_numpy()
+        self.t = fits['t'].to_numpy(dtype=float)
+        self.grid = moneyness_grid()
+        self.butterfly = list(fits.index[fits['flattened'].to_numpy(dtype=bool)])
+
+        variance = slice_variance(fits, self.grid[None, :])
+        self.variance = np.maximum.accumulate(variance, axis=0)
+        self.calendar = int((self.variance > variance).sum())
+
+    def __len__(self):
+        return len(self.t)
+
+    def total_variance(self, k, t):
+        """Total variance at log-moneyness k and time t (years), vectorized.
+
+        Linear in total variance between expirations (which keeps the
+        calendar repair), constant volatility before the first and after the
+        last expiration.
+        """
+        k, t = np.broadcast_arrays(np.asarray(k, dtype=float), np.asarray(t, dtype=float))
+        step = self.grid[1] - self.grid[0]
+        pos = (np.clip(k, self.grid[0], self.grid[-1]) - self.grid[0]) / step
+        j = np.minimum(pos.astype(np.int64), len(self.grid) - 2)
+        fk = pos - j
+
+        def row(i):
+            return self.variance[i, j] * (1 - fk) + self.variance[i, j + 1] * fk
+
+        n = len(self.t)
+        if n == 1:
+            return row(0) * t / self.t[0]
+        i = np.clip(np.searchsorted(self.t, t), 1, n - 1)
+        t0, t1 = self.t[i - 1], self.t[i]
+        ft = (t - t0) / (t1 - t0)
+        w = row(i - 1) * (1 - ft) + row(i) * ft
+        w = np.where(t < self.t[0], row(0) * t / self.t[0], w)
+        return np.where(t > self.t[-1], row(n - 1) * t / self.t[-1], w)
+
+    def iv(self, strike, t, spot=None):
+        """Implied volatility at any strike and time to expiry (years).
+
+        With a new `spot` the smile moves with the forward (sticky moneyness).
+        """
+        spot = self.spot if spot is None else spot
+        strike, t = np.broadcast_arrays(np.asarray(strike, dtype=float), np.asarray(t, dtype=float))
+        k = np.log(strike / (spot * np.exp((self.r - self.q) * t)))
+        return np.sqrt(self.total_variance(k, t) / t)
+
+    def chain_iv(self, chain, spot=None, now=None):
+        """Surface IVs for the contracts of a load_chain frame, e.g. for dealer_exposure(iv=...)."""
+        t = time_to_expiry(chain['expiration'].to_numpy(), now=now)
+        return pd.Series(self.iv(chain['strike'].to_numpy(dtype=float), t, spot=spot),
+                         index=chain.index, name='impliedVolatility')
+
+
+def quote_hashes(chain):
+    """{expiration: hash of its strikes and quotes}."""
+    rows = pd.util.hash_pandas_object(chain[QUOTE_COLUMNS], index=False).to_numpy()
+    codes, expirations = pd.factorize(chain['expiration'].to_numpy())
+    # Sum of row hashes modulo 2**64: cheap and independent of row order
+    totals = np.zeros(len(expirations), dtype=np.uint64)
+    np.add.at(totals, codes, rows)
+    return dict(zip(expirations, totals.tolist()))
+
+
+_Entry = namedtuple('_Entry', ['spot', 'fitted_at', 'hashes', 'fits', 'surface'])
+
+
+class SurfaceCache:
+    """Latest VolSurface per ticker, refitting only the slices whose quotes changed.
+
+    A spot change, or REFIT_AFTER seconds since the last full fit, refits
+    every slice.
+    """
+
+    def __init__(self, refit_after=REFIT_AFTER):
+        self.refit_after = refit_after
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, ticker):
+        entry = self._entries.get(ticker)
+        return entry and entry.surface
+
+    def update(self, ticker, chain, spot, now=None, r=RISK_FREE_RATE, q=DIVIDEND_YIELD):
+        """Surface of `chain` (every expiration of one ticker), reusing unchanged slices."""
+        hashes = quote_hashes(chain)
+        with self._lock:
+            entry = self._entries.get(ticker)
+        fitted_at = time.time()
+        if entry is None or entry.spot != spot or fitted_at - entry.fitted_at > self.refit_after:
+            stale, kept = list(hashes), None
+        else:
+            if entry.hashes == hashes:
+                return entry.surface
+            stale = [exp for exp, value in hashes.items() if entry.hashes.get(exp) != value]
+            kept = entry.fits[entry.fits.index.isin([exp for exp in hashes if exp not in stale])]
+            fitted_at = entry.fitted_at
+
+        fresh = fit_chain(chain[chain['expiration'].isin(stale)], spot, now=now, r=r, q=q)
+        metrics.count('surface_slices_refit', len(fresh))
+        fits = fresh if kept is None else pd.concat([kept, fresh])
+        surface = VolSurface(spot, fits, r=r, q=q)
+        with self._lock:
+            self._entries[ticker] = _Entry(spot, fitted_at, hashes, fits, surface)
+        return surface
+
+
+surfaces = SurfaceCache()
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from stocks.greeks import CONTRACT_SIZE, black_scholes_greeks, dealer_exposure
+from stocks.implied_vol import price_and_vega
+
+SPOT = 100.0
+STRIKE = np.array([80.0, 95.0, 100.0, 105.0, 120.0] * 2)
+T = np.array([0.05, 0.25, 0.5, 1.0, 2.0] * 2)
+IV = np.array([0.45, 0.3, 0.2, 0.25, 0.35] * 2)
+IS_CALL = np.repeat([True, False], 5)
+R, Q = 0.04, 0.01
+
+
+def price(spot=SPOT, t=T, iv=IV):
+    return price_and_vega(spot, STRIKE, t, iv, IS_CALL, r=R, q=Q)[0]
+
+
+def delta(spot=SPOT, t=T, iv=IV):
+    return black_scholes_greeks(spot, STRIKE, t, iv, IS_CALL, r=R, q=Q)['delta']
+
+
+def test_greeks_match_finite_differences():
+    greeks = black_scholes_greeks(SPOT, STRIKE, T, IV, IS_CALL, r=R, q=Q)
+    h = 1e-3
+    np.testing.assert_allclose(greeks['delta'], (price(SPOT + h) - price(SPOT - h)) / (2 * h), rtol=1e-6)
+    np.testing.assert_allclose(greeks['gamma'], (price(SPOT + h) - 2 * price() + price(SPOT - h)) / h ** 2,
+                               rtol=1e-4)
+    h = 1e-5
+    np.testing.assert_allclose(greeks['vanna'], (delta(iv=IV + h) - delta(iv=IV - h)) / (2 * h), rtol=1e-6)
+    # Charm is the change of delta as time passes, i.e. as t shrinks
+    np.testing.assert_allclose(greeks['charm'], -(delta(t=T + h) - delta(t=T - h)) / (2 * h), rtol=1e-6)
+
+
+def test_dealer_exposure_units():
+    now = pd.Timestamp('2026-01-05 10:00', tz='US/Eastern')
+    chain = pd.DataFrame({'strike': [95.0, 105.0], 'impliedVolatility': [0.2, 0.25], 'is_call': [True, False],
+                          'openInterest': [1000.0, 500.0], 'expiration': ['2026-02-20', '2026-02-20']})
+    exposure = dealer_exposure(chain, SPOT, now=now)
+    greeks = black_scholes_greeks(SPOT, chain['strike'], exposure['t'], chain['impliedVolatility'],
+                                  chain['is_call'])
+    # Dealers long the calls and short the puts
+    position = np.array([1000.0, -500.0]) * CONTRACT_SIZE
+    np.testing.assert_allclose(exposure['delta_exposure'], greeks['delta'] * position * SPOT)
+    np.testing.assert_allclose(exposure['gamma_exposure'], greeks['gamma'] * position * SPOT ** 2 * 0.01)
+    np.testing.assert_allclose(exposure['vanna_exposure'], greeks['vanna'] * position * SPOT * 0.01)
+    np.testing.assert_allclose(exposure['charm_exposure'], greeks['charm'] * position * SPOT / 365.0)
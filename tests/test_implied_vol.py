@@ -0,0 +1,32 @@
+import numpy as np
+
+from stocks.implied_vol import PRICE_TOL, VOL_TOL, implied_volatility, price_and_vega
+
+
+def test_round_trip():
+    rng = np.random.default_rng(0)
+    n = 2000
+    spot = 100.0
+    strike = spot * np.exp(rng.uniform(-0.3, 0.3, n))
+    t = rng.uniform(1 / 365, 2.0, n)
+    iv = rng.uniform(0.05, 1.5, n)
+    is_call = rng.random(n) < 0.5
+    price, vega = price_and_vega(spot, strike, t, iv, is_call)
+    # The solver stops on the price error, which moves IV by about error / vega;
+    # with next to no vega (far from the money) only the price is pinned down
+    tolerance = 2 * PRICE_TOL / np.maximum(vega, 1e-12) + VOL_TOL
+    sensitive = vega > 1e-2
+
+    for initial in (None, iv * 1.1):
+        solved = implied_volatility(price, spot, strike, t, is_call, initial=initial)
+        assert np.all(np.abs(solved - iv)[sensitive] <= tolerance[sensitive])
+        # Deep in the money prices can round onto the no-arbitrage bound, which is NaN
+        finite = np.isfinite(solved)
+        repriced, _ = price_and_vega(spot, strike, t, solved, is_call)
+        np.testing.assert_allclose(repriced[finite], price[finite], atol=PRICE_TOL)
+
+
+def test_prices_outside_bounds_are_nan():
+    # Below intrinsic value, and above the spot price for a call
+    solved = implied_volatility(np.array([5.0, 150.0]), 100.0, np.array([90.0, 90.0]), 0.5, True)
+    assert np.isnan(solved).all()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from stocks.greeks import dealer_exposure
+from stocks.key_levels import gamma_walls, key_levels, zero_crossing
+
+
+def test_zero_crossing_interpolates_nearest_root():
+    x = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    y = np.array([-2.0, 2.0, 1.0, -1.0, -3.0])
+    assert zero_crossing(x, y, 1.0) == 1.5
+    assert zero_crossing(x, y, 4.0) == 3.5
+
+
+def test_flat_profile_has_no_zero():
+    assert zero_crossing([1.0, 2.0, 3.0], [0.0, 0.0, 0.0], 2.0) is None
+    assert zero_crossing([1.0, 2.0, 3.0], [1.0, 2.0, 1.0], 2.0) is None
+
+
+def test_no_open_interest_has_no_levels():
+    now = pd.Timestamp('2026-01-05 10:00', tz='US/Eastern')
+    chain = dealer_exposure(pd.DataFrame({
+        'strike': [90.0, 100.0, 110.0, 90.0, 100.0, 110.0],
+        'impliedVolatility': 0.2,
+        'is_call': [True] * 3 + [False] * 3,
+        'openInterest': [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        'expiration': '2026-02-20',
+    }), 100.0, now=now)
+    levels = key_levels(chain, 100.0)
+    assert (levels.zero_gamma, levels.call_wall, levels.put_wall) == (None, None, None)
+
+    chain.loc[1, 'openInterest'] = 1000.0
+    chain = dealer_exposure(chain, 100.0, now=now)
+    assert gamma_walls(chain) == (100.0, None)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from stocks.greeks import CONTRACT_SIZE
+from stocks.max_pain import max_pain
+
+
+def brute_force(chain):
+    """O(strikes^2) holder payout at every listed strike of each expiration."""
+    rows = []
+    for expiration, group in chain.groupby('expiration'):
+        calls, puts = group[group['is_call']], group[~group['is_call']]
+        payouts = {p: ((np.maximum(p - calls['strike'], 0) * calls['openInterest']).sum()
+                       + (np.maximum(puts['strike'] - p, 0) * puts['openInterest']).sum()) * CONTRACT_SIZE
+                   for p in np.unique(group['strike'])}
+        best = min(payouts, key=payouts.get)
+        rows.append((expiration, best, payouts[best]))
+    return pd.DataFrame(rows, columns=['expiration', 'max_pain', 'payout'])
+
+
+def test_matches_brute_force():
+    rng = np.random.default_rng(1)
+    n = 3000
+    chain = pd.DataFrame({
+        'expiration': rng.choice(['2026-01-16', '2026-02-20', '2026-03-20', '2026-06-18'], n),
+        'strike': rng.integers(60, 141, n).astype(float),
+        'is_call': rng.random(n) < 0.5,
+        'openInterest': rng.uniform(0, 5000, n),
+    })
+    result = max_pain(chain)
+    expected = brute_force(chain)
+    np.testing.assert_array_equal(result['expiration'], expected['expiration'])
+    np.testing.assert_array_equal(result['max_pain'], expected['max_pain'])
+    np.testing.assert_allclose(result['payout'], expected['payout'], rtol=1e-9)
+
+
+def test_empty_chain():
+    chain = pd.DataFrame(columns=['expiration', 'strike', 'is_call', 'openInterest'])
+    assert max_pain(chain).empty
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from stocks.greeks import EXPOSURE_COLUMNS, dealer_exposure
+from stocks.scenarios import scenario_grid
+
+
+def exposure_chain(spot, n=400, seed=2):
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp('2026-01-05 10:00', tz='US/Eastern')
+    chain = pd.DataFrame({
+        'strike': np.round(spot * np.exp(rng.normal(0, 0.1, n))),
+        'impliedVolatility': rng.uniform(0.1, 0.6, n),
+        'is_call': rng.random(n) < 0.5,
+        'openInterest': rng.integers(0, 5000, n).astype(float),
+        'expiration': rng.choice(['2026-01-09', '2026-01-16', '2026-03-20', '2026-12-18'], n),
+    })
+    return dealer_exposure(chain, spot, now=now, q=0.01)
+
+
+def test_centre_cell_matches_dealer_exposure():
+    spot = 500.0
+    chain = exposure_chain(spot)
+    grid = scenario_grid(chain, spot, moves=[0.95, 1.0, 1.05], shocks=[-0.05, 0.0, 0.05], q=0.01, max_cells=1000)
+    for column in EXPOSURE_COLUMNS:
+        np.testing.assert_allclose(getattr(grid, column)[1, 1], chain[column].sum(), rtol=1e-9)
+
+
+def test_chunking_does_not_change_the_grid():
+    spot = 500.0
+    chain = exposure_chain(spot)
+    whole = scenario_grid(chain, spot, days=3)
+    chunked = scenario_grid(chain, spot, days=3, max_cells=50_000)
+    for column in EXPOSURE_COLUMNS:
+        np.testing.assert_allclose(getattr(chunked, column), getattr(whole, column), rtol=1e-9, atol=1e-6)
+
+
+def test_no_surviving_contracts_is_nan():
+    spot = 500.0
+    grid = scenario_grid(exposure_chain(spot), spot, days=400)
+    for column in EXPOSURE_COLUMNS:
+        assert np.isnan(getattr(grid, column)).all()